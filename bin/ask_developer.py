@@ -1,7 +1,12 @@
 import task_agent as ta
 import toml
+import argparse
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resume", action="store_true", help="continue the developer agent from its last checkpoint")
+    args = parser.parse_args()
+
     with open("agent.toml", 'r', encoding='utf-8') as f:
         config = toml.load(f)
         
@@ -11,5 +16,7 @@ if __name__ == "__main__":
         comment_language = config['project']['comment_language']
         readme_language = config['project']['readme_language']
         base_path = config['project']['base_path']
+        ta.configure_transport(**config.get('llm', {}))
+        agent_options = config.get('agent', {})
 
-        ta.developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language)
+        ta.developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language, edit_mode=agent_options.get('edit_mode', 'full'), resume=args.resume)
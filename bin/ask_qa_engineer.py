@@ -11,5 +11,6 @@ if __name__ == "__main__":
         comment_language = config['project']['comment_language']
         readme_language = config['project']['readme_language']
         base_path = config['project']['base_path']
+        ta.configure_transport(**config.get('llm', {}))
 
         ta.qa_engineer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language)
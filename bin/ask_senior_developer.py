@@ -11,5 +11,7 @@ if __name__ == "__main__":
         comment_language = config['project']['comment_language']
         readme_language = config['project']['readme_language']
         base_path = config['project']['base_path']
+        ta.configure_transport(**config.get('llm', {}))
+        agent_options = config.get('agent', {})
 
-        ta.senior_developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language)
+        ta.senior_developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language, generation_mode=agent_options.get('generation_mode', 'batch'), design_candidates=agent_options.get('design_candidates', 1), design_top_k=agent_options.get('design_top_k', 1))
@@ -0,0 +1,23 @@
+import os
+import time
+import argparse
+import task_agent.batch as batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the senior developer -> QA engineer -> developer pipeline for many projects in parallel.")
+    parser.add_argument("sources", nargs="+", help="project configs (like agent.toml), directories of them, or manifest files listing one config per line")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: number of cores)")
+    parser.add_argument("--max-llm-concurrency", type=int, default=8, help="completion requests in flight across all workers")
+    parser.add_argument("--log-dir", help="per-project logs and the report (default: .tdd_agents/batch/<timestamp>)")
+    parser.add_argument("--resume", action="store_true", help="continue each project from its developer agent checkpoint")
+    args = parser.parse_args()
+
+    config_paths = batch.find_project_configs(args.sources)
+    if not config_paths:
+        parser.error("no project configs found")
+    log_dir = args.log_dir or os.path.join(".tdd_agents", "batch", time.strftime("%Y%m%d-%H%M%S"))
+    print(f"Running {len(config_paths)} projects, logs in {log_dir}")
+
+    report = batch.run_batch(config_paths, log_dir, workers=args.workers, max_llm_concurrency=args.max_llm_concurrency, resume=args.resume)
+    batch.save_batch_report(report, os.path.join(log_dir, "report.json"))
+    print(batch.format_batch_report(report))
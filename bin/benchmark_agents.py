@@ -0,0 +1,169 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import toml
+
+# 未安装时也能直接在仓库中运行
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_PATH, "src"))
+
+import task_agent as ta
+from task_agent.checkpoint import load_checkpoint
+from task_agent.mock_server import MockLLMServer, ResponseScript
+
+FIXTURE_DIR = os.path.join(REPO_PATH, "benchmarks", "fixtures")
+PHASES = ["senior_developer_agent", "qa_engineer_agent", "developer_agent"]
+METRICS = ["wall_time", "calls", "prompt_tokens", "completion_tokens"]
+
+
+def run_fixture(path: str, workspace: str, recorded: list, verbose: bool) -> dict:
+    """
+    Run the three agents end to end on one fixture against a local mock server and return the
+    wall time, call count and tokens of each phase.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        fixture = toml.load(f)
+    project = fixture["project"]
+    agent_options = fixture.get("agent", {})
+    server_options = fixture.get("server", {})
+
+    script = ResponseScript.from_fixture(fixture)
+    for recorded_path in recorded:
+        script.load_recorded(recorded_path)
+    server = MockLLMServer(script, latency=server_options.get("latency", 0.0), tokens_per_second=server_options.get("tokens_per_second")).start()
+
+    os.environ["PROVIDER"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ["CHECKPOINT_DIR"] = os.path.join(workspace, "checkpoints")
+    os.environ["CALL_LOG"] = os.path.join(workspace, "calls.jsonl")
+    ta.configure_transport(max_retries=0)
+
+    base_path = os.path.join(workspace, "project")
+    args = (project["requirement"], project["language"], project["libraries"], base_path, project["comment_language"], project["readme_language"])
+    phase = {"name": None}
+    records = []
+
+    def collect(record: dict) -> None:
+        records.append(dict(record, phase=phase["name"]))
+
+    results = {}
+    ta.add_hook(collect)
+    log_path = os.path.join(workspace, "agents.log")
+    try:
+        with open(log_path, 'w', encoding='utf-8') as log:
+            with contextlib.ExitStack() as stack:
+                if not verbose:
+                    stack.enter_context(contextlib.redirect_stdout(log))
+                for name in PHASES:
+                    phase["name"] = name
+                    start = time.perf_counter()
+                    if name == "senior_developer_agent":
+                        ta.senior_developer_agent(*args, generation_mode=agent_options.get("generation_mode", "batch"), design_candidates=agent_options.get("design_candidates", 1), design_top_k=agent_options.get("design_top_k", 1))
+                    elif name == "qa_engineer_agent":
+                        ta.qa_engineer_agent(*args)
+                    else:
+                        ta.developer_agent(*args, edit_mode=agent_options.get("edit_mode", "full"))
+                    phase_records = [record for record in records if record["phase"] == name]
+                    results[name] = {
+                        "wall_time": round(time.perf_counter() - start, 3),
+                        "calls": len(phase_records),
+                        "prompt_tokens": sum(record["prompt_tokens"] for record in phase_records),
+                        "completion_tokens": sum(record["completion_tokens"] for record in phase_records),
+                    }
+    finally:
+        ta.remove_hook(collect)
+        server.stop()
+
+    checkpoint = load_checkpoint(base_path) or {}
+    results["completed"] = checkpoint.get("phase") == "completed"
+    results["unused_responses"] = script.unused_rules()
+    results["unmatched_prompts"] = server.unmatched_prompts
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare with a previous run: any extra call is a regression, tokens and wall time may grow by tolerance.
+    """
+    regressions = []
+    for fixture, phases in results.items():
+        for name in PHASES:
+            current = phases.get(name)
+            previous = baseline.get(fixture, {}).get(name)
+            if not current or not previous:
+                continue
+            for metric in METRICS:
+                allowed = previous[metric] if metric == "calls" else previous[metric] * (1 + tolerance)
+                if current[metric] > allowed:
+                    regressions.append(f"{fixture} / {name}: {metric} {previous[metric]} -> {current[metric]}")
+        if baseline.get(fixture, {}).get("completed") and not phases.get("completed"):
+            regressions.append(f"{fixture}: the developer agent no longer completes")
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    header = f"{'fixture / phase':<44}{'wall s':>9}{'calls':>7}{'prompt tok':>12}{'compl tok':>11}"
+    print(header)
+    print("-" * len(header))
+    for fixture, phases in results.items():
+        print(f"{fixture}{'' if phases['completed'] else '  (NOT COMPLETED)'}")
+        for name in PHASES:
+            if name in phases:
+                row = phases[name]
+                print(f"  {name:<42}{row['wall_time']:>9.2f}{row['calls']:>7}{row['prompt_tokens']:>12}{row['completion_tokens']:>11}")
+        if phases["unmatched_prompts"]:
+            print(f"  {len(phases['unmatched_prompts'])} prompts had no scripted response, e.g.: {phases['unmatched_prompts'][0][:120]!r}")
+        if phases["unused_responses"]:
+            print(f"  unused scripted responses: {', '.join(phases['unused_responses'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the agents end to end on fixture projects against a local mock LLM server.")
+    parser.add_argument("fixtures", nargs="*", help="fixture files (default: benchmarks/fixtures/*.toml)")
+    parser.add_argument("--recorded", action="append", default=[], help="JSONL file of recorded responses, used before the scripted ones")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative growth of tokens and wall time")
+    parser.add_argument("--keep", action="store_true", help="keep the generated workspaces")
+    parser.add_argument("--verbose", action="store_true", help="show the agents' output instead of writing it to agents.log")
+    args = parser.parse_args()
+
+    # 基准测试衡量的是调用次数，关闭响应缓存以免命中掩盖回退
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ.setdefault("MODEL", "mock")
+    os.environ.setdefault("STRUCTURED_OUTPUT", "json_schema")
+
+    results = {}
+    fixtures = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.toml")))
+    # 也可以只写 benchmarks/fixtures 下的文件名
+    fixtures = [path if os.path.exists(path) else os.path.join(FIXTURE_DIR, f"{path}.toml") for path in fixtures]
+    for path in fixtures:
+        name = os.path.splitext(os.path.basename(path))[0]
+        workspace = tempfile.mkdtemp(prefix=f"tdd_bench_{name}_")
+        print(f"Running {name} in {workspace}...")
+        try:
+            results[name] = run_fixture(path, workspace, args.recorded, args.verbose)
+        finally:
+            if not args.keep:
+                shutil.rmtree(workspace, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
@@ -0,0 +1,58 @@
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+
+# 未安装时也能直接在仓库中运行
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+SCENARIOS = {
+    "import task_agent": "import task_agent",
+    "import helpers": "from task_agent.agent import parse_design",
+    "load developer_agent": "import task_agent; task_agent.developer_agent",
+}
+
+
+def run_once(code: str, env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(code: str, env: dict, limit: int) -> list:
+    """
+    Return the modules with the largest cumulative import time according to -X importtime.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        imports.append((int(cumulative_us), name))
+    return sorted(imports, reverse=True)[:limit]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold start time of the task_agent package.")
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreters per scenario")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_PATH, env.get("PYTHONPATH")]))
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+
+    baseline = [run_once("pass", env) for _ in range(args.runs)]
+    print(f"{'scenario':<24}{'median':>10}{'min':>10}{'over python':>14}")
+    print(f"{'python -c pass':<24}{statistics.median(baseline) * 1000:>8.1f}ms{min(baseline) * 1000:>8.1f}ms{'':>14}")
+    for label, code in SCENARIOS.items():
+        timings = [run_once(code, env) for _ in range(args.runs)]
+        overhead = (statistics.median(timings) - statistics.median(baseline)) * 1000
+        print(f"{label:<24}{statistics.median(timings) * 1000:>8.1f}ms{min(timings) * 1000:>8.1f}ms{overhead:>12.1f}ms")
+
+    print(f"\nSlowest imports for `{SCENARIOS['import task_agent']}`:")
+    for cumulative_us, name in slowest_imports(SCENARIOS["import task_agent"], env, args.top):
+        print(f"{cumulative_us / 1000:>8.1f}ms  {name}")
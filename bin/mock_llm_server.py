@@ -0,0 +1,38 @@
+import os
+import sys
+import argparse
+import toml
+
+# 未安装时也能直接在仓库中运行
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from task_agent.mock_server import MockLLMServer, ResponseScript
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve scripted or recorded responses on an OpenAI-compatible /v1/chat/completions endpoint.")
+    parser.add_argument("fixture", nargs="?", help="fixture file with [[responses]] rules")
+    parser.add_argument("--recorded", action="append", default=[], help="JSONL file of recorded responses")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, help="seconds before the first token (overrides the fixture)")
+    parser.add_argument("--tokens-per-second", type=float, help="generation speed (overrides the fixture)")
+    args = parser.parse_args()
+
+    fixture = {}
+    if args.fixture:
+        with open(args.fixture, 'r', encoding='utf-8') as f:
+            fixture = toml.load(f)
+    server_options = fixture.get("server", {})
+    script = ResponseScript.from_fixture(fixture)
+    for recorded_path in args.recorded:
+        script.load_recorded(recorded_path)
+
+    latency = args.latency if args.latency is not None else server_options.get("latency", 0.0)
+    tokens_per_second = args.tokens_per_second or server_options.get("tokens_per_second")
+    server = MockLLMServer(script, port=args.port, latency=latency, tokens_per_second=tokens_per_second)
+    print(f"Mock LLM server listening on {server.base_url} (set PROVIDER to this URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
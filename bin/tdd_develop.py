@@ -1,7 +1,13 @@
 import task_agent as ta
+from task_agent.checkpoint import load_checkpoint
 import toml
+import argparse
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resume", action="store_true", help="continue the developer agent from its last checkpoint")
+    args = parser.parse_args()
+
     with open("agent.toml", 'r', encoding='utf-8') as f:
         config = toml.load(f)
         
@@ -11,8 +17,11 @@ if __name__ == "__main__":
         comment_language = config['project']['comment_language']
         readme_language = config['project']['readme_language']
         base_path = config['project']['base_path']
+        ta.configure_transport(**config.get('llm', {}))
+        agent_options = config.get('agent', {})
 
-        ta.senior_developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language)
-                
-        ta.qa_engineer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language)
-        ta.developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language)
+        if not (args.resume and load_checkpoint(base_path)):
+            ta.senior_developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language, generation_mode=agent_options.get('generation_mode', 'batch'), design_candidates=agent_options.get('design_candidates', 1), design_top_k=agent_options.get('design_top_k', 1))
+                    
+            ta.qa_engineer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language)
+        ta.developer_agent(requirement_description, language, libraries, base_path, comment_language, readme_language, edit_mode=agent_options.get('edit_mode', 'full'), resume=args.resume)
@@ -1,3 +1,44 @@
-from .senior_developer_agent import senior_developer_agent
-from .developer_agent import developer_agent
-from .qa_engineer_agent import qa_engineer_agent
\ No newline at end of file
+import sys
+import types
+import importlib
+
+# 按需导入：import task_agent 时不加载 openai、dotenv 等依赖，也不创建客户端
+_LAZY_ATTRIBUTES = {
+    "senior_developer_agent": ".senior_developer_agent",
+    "developer_agent": ".developer_agent",
+    "qa_engineer_agent": ".qa_engineer_agent",
+    "configure_transport": ".agent",
+    "get_client": ".agent",
+    "set_client": ".agent",
+    "add_hook": ".instrumentation",
+    "remove_hook": ".instrumentation",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+# 与子模块同名的入口函数
+_ENTRY_POINTS = ("senior_developer_agent", "developer_agent", "qa_engineer_agent")
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name: str, value) -> None:
+        # 导入子模块（如 import task_agent.developer_agent）时，import 机制会把包属性设为子模块，
+        # 这里改为绑定同名函数，避免 ta.developer_agent(...) 变成调用模块对象
+        if name in _ENTRY_POINTS and isinstance(value, types.ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,47 +1,379 @@
 import os
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Callable, Any, Iterator
 import re
-import openai
-from dotenv import load_dotenv
+import time
+import threading
+import weakref
 import json
+from .config import getenv
+from .cache import ResponseCache
+from .path_filter import build_project_structure
+from .languages import get_language_adapter
+from .transport import TransportConfig, build_openai_client, call_with_retries, call_with_retries_async
+from .instrumentation import track_call, mark_first_token, add_usage, find_caller, caller_scope
+from .transcript import transcript_client, get_transcript
+from .budget import count_message_tokens, get_max_output_tokens
+
+STOP_SEQUENCE = "<comp>continue...</comp>"
+# 输出被截断时，带着原始提示词和已生成的部分发送续写请求
+CONTINUE_PROMPT = "Your previous message was cut off. Continue exactly where it stopped, without repeating any of it and without any introduction."
+# 单次补全最多续写的次数
+MAX_CONTINUATIONS = 8
+# 上下文窗口剩余空间少于此值时不再续写
+MIN_CONTINUATION_TOKENS = 256
+
+# 客户端与配置在首次请求时才创建，import 时不读取 .env、不连接服务端
+_state_lock = threading.RLock()
+client = None
+async_client_factory = None
+transport_config = None
+response_cache = None
+_request_slots = None
+# 以下设置为 None 时从 .env 读取
+MODEL = None
+CACHE_ENABLED = None
+# 结构化输出方式：auto / json_schema / json_object / ollama / none
+STRUCTURED_OUTPUT = None
+# 同时进行中的请求数上限，同步线程与 asyncio 协程分别受各自的信号量约束
+MAX_CONCURRENCY = None
+# 每个事件循环各自持有一个 AsyncOpenAI 客户端（连接池）和信号量
+_async_state = weakref.WeakKeyDictionary()
+
+def get_model() -> Optional[str]:
+    global MODEL
+    if MODEL is None:
+        MODEL = getenv("MODEL")
+    return MODEL
+
+def get_max_concurrency() -> int:
+    global MAX_CONCURRENCY
+    if MAX_CONCURRENCY is None:
+        MAX_CONCURRENCY = int(getenv("MAX_CONCURRENCY", "4"))
+    return MAX_CONCURRENCY
+
+def get_structured_output() -> str:
+    global STRUCTURED_OUTPUT
+    if STRUCTURED_OUTPUT is None:
+        STRUCTURED_OUTPUT = getenv("STRUCTURED_OUTPUT", "auto").lower()
+    return STRUCTURED_OUTPUT
+
+def is_cache_enabled() -> bool:
+    global CACHE_ENABLED
+    if CACHE_ENABLED is None:
+        CACHE_ENABLED = getenv("CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+    # 记录或回放时不使用缓存，保证每次请求都写入或取自记录
+    return CACHE_ENABLED and get_transcript() is None
+
+def get_response_cache() -> ResponseCache:
+    global response_cache
+    with _state_lock:
+        if response_cache is None:
+            response_cache = ResponseCache(
+                getenv("CACHE_DIR", ".tdd_agents/cache"),
+                max_bytes=int(getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+                ttl=float(getenv("CACHE_TTL", str(7 * 24 * 3600))),
+            )
+        return response_cache
+
+def get_transport_config() -> TransportConfig:
+    global transport_config
+    with _state_lock:
+        if transport_config is None:
+            transport_config = TransportConfig()
+        return transport_config
+
+def get_client():
+    """
+    Return the shared OpenAI client, creating it on first use.
+    """
+    global client
+    with _state_lock:
+        if client is None:
+            client = transcript_client(lambda: build_openai_client(get_transport_config(), getenv("PROVIDER"), getenv("OPENAI_API_KEY")))
+        return client
 
-load_dotenv()
-
-client = openai.OpenAI(
-    base_url=os.getenv("PROVIDER"),
-    api_key=os.getenv("OPENAI_API_KEY")
-)
-MODEL = os.getenv("MODEL")
-
-def get_completion(prompt: str, system_message: str = "You are a helpful assistant.", model: str = MODEL, temperature: float = 0.3) -> str:
-    full_response = ""
-    current_prompt = prompt
-    stop_sequence = "<comp>continue...</comp>"
-    max_tokens_per_request = 2048
-
-    while True:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens_per_request,
-            stop=[stop_sequence],
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": current_prompt},
-            ],
-        )
-
-        current_response = response.choices[0].message.content
-        finish_reason = response.choices[0].finish_reason
-
-        full_response += current_response.rstrip(stop_sequence)
-
-        if finish_reason == "stop" or not current_response.endswith(stop_sequence):
-            break
+def set_client(sync_client=None, async_client_factory_: Optional[Callable[[], Any]] = None) -> None:
+    """
+    Inject the client used by the completion functions (e.g. a fake in tests). async_client_factory_
+    builds the client used by get_completion_async, one per event loop. Passing None restores the default.
+    """
+    global client, async_client_factory
+    with _state_lock:
+        client = sync_client
+        async_client_factory = async_client_factory_
+        _async_state.clear()
+
+def _get_request_slots() -> threading.BoundedSemaphore:
+    global _request_slots
+    with _state_lock:
+        if _request_slots is None:
+            _request_slots = threading.BoundedSemaphore(get_max_concurrency())
+        return _request_slots
+
+def set_max_concurrency(limit: int) -> None:
+    """
+    Change the maximum number of completion requests in flight at the same time.
+    """
+    global MAX_CONCURRENCY, _request_slots
+    with _state_lock:
+        MAX_CONCURRENCY = max(1, int(limit))
+        _request_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+        _async_state.clear()
+
+def set_request_slots(slots) -> None:
+    """
+    Share the semaphore that limits completion requests in flight, e.g. a multiprocessing.BoundedSemaphore
+    that caps requests across all worker processes of a batch run. It replaces the MAX_CONCURRENCY limit.
+    """
+    global _request_slots
+    with _state_lock:
+        _request_slots = slots
+
+def configure_transport(**options) -> None:
+    """
+    Rebuild the shared clients with transport options, e.g. the [llm] section of agent.toml:
+    max_connections, max_keepalive_connections, keepalive_expiry, connect_timeout, read_timeout,
+    http2, max_retries, backoff_base and backoff_max. Options not given fall back to .env.
+    """
+    global transport_config, client
+    with _state_lock:
+        transport_config = TransportConfig(**options)
+        client = None
+        _async_state.clear()
+
+def _get_async_state() -> Tuple[Any, Any]:
+    # asyncio 的导入开销较大，只在异步接口中导入
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    state = _async_state.get(loop)
+    if state is None:
+        if async_client_factory is not None:
+            async_client = async_client_factory()
         else:
-            current_prompt = "go on..."
+            async_client = transcript_client(lambda: build_openai_client(get_transport_config(), getenv("PROVIDER"), getenv("OPENAI_API_KEY"), async_client=True), async_client=True)
+        state = (async_client, asyncio.Semaphore(get_max_concurrency()))
+        _async_state[loop] = state
+    return state
+
+def _get_cache_key(prompt: str, system_message: str, model: str, temperature: float, max_tokens: int, use_cache: bool, request_options: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    if not (use_cache and is_cache_enabled()):
+        return None
+    fields = {}
+    if request_options:
+        fields["request_options"] = request_options
+    return ResponseCache.make_key(
+        model=model,
+        system_message=system_message,
+        prompt=prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **fields,
+    )
+
+def _resolve_max_tokens(max_tokens: Optional[int], model: str, messages: List[Dict[str, Any]]) -> int:
+    # 未指定时按模型的输出上限和提示词占用后剩余的上下文窗口计算
+    if max_tokens:
+        return max_tokens
+    return max(get_max_output_tokens(model, count_message_tokens(messages, model)), MIN_CONTINUATION_TOKENS)
+
+def _build_request(prompt: str, system_message: str, model: str, temperature: float, max_tokens: Optional[int], request_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt},
+    ]
+    return {
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": _resolve_max_tokens(max_tokens, model, messages),
+        "stop": [STOP_SEQUENCE],
+        "messages": messages,
+        **(request_options or {}),
+    }
+
+def _build_continuation(request: Dict[str, Any], partial_response: str, max_tokens: Optional[int], continuations: int) -> Optional[Dict[str, Any]]:
+    """
+    Request for the rest of a truncated response: the original messages, the partial answer as the
+    assistant turn and CONTINUE_PROMPT. Returns None when the response cannot be continued.
+    """
+    if continuations >= MAX_CONTINUATIONS:
+        print(f"Response still truncated after {continuations} continuations, keeping the partial response.")
+        return None
+    model = request["model"]
+    messages = request["messages"][:2] + [
+        {"role": "assistant", "content": partial_response},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+    room = get_max_output_tokens(model, count_message_tokens(messages, model))
+    if room < MIN_CONTINUATION_TOKENS:
+        print(f"Only {room} tokens left in the context window of {model}, keeping the partial response.")
+        return None
+    return dict(request, messages=messages, max_tokens=min(max_tokens, room) if max_tokens else room)
+
+def _is_truncated(current_response: str, finish_reason: Optional[str]) -> bool:
+    # length：达到 max_tokens；部分服务端会把停止序列保留在输出中
+    return finish_reason == "length" or current_response.endswith(STOP_SEQUENCE)
+
+def _request_text(request: Dict[str, Any]) -> str:
+    return "".join(str(message.get("content") or "") for message in request["messages"])
+
+def _store_completion(cache_key: Optional[str], full_response: str) -> str:
+    full_response = full_response.strip()
+    if cache_key and full_response:
+        get_response_cache().set(cache_key, full_response)
+    return full_response
+
+def get_completion(prompt: str, system_message: str = "You are a helpful assistant.", model: Optional[str] = None, temperature: float = 0.3, max_tokens: Optional[int] = None, use_cache: bool = True, request_options: Optional[Dict[str, Any]] = None) -> str:
+    model = model or get_model()
+    cache_key = _get_cache_key(prompt, system_message, model, temperature, max_tokens, use_cache, request_options)
+    with track_call("sync", model, cache_key is not None) as call:
+        if cache_key:
+            cached_response = get_response_cache().get(cache_key)
+            if cached_response is not None:
+                call["cache"] = "hit"
+                return cached_response
+
+        full_response = ""
+        request = _build_request(prompt, system_message, model, temperature, max_tokens, request_options)
+
+        while True:
+            with _get_request_slots():
+                response = call_with_retries(lambda: get_client().chat.completions.create(**request), get_transport_config(), stats=call)
+
+            current_response = response.choices[0].message.content or ""
+            finish_reason = response.choices[0].finish_reason
+            add_usage(call, getattr(response, "usage", None), _request_text(request), current_response)
+
+            full_response += current_response.removesuffix(STOP_SEQUENCE)
+
+            if not _is_truncated(current_response, finish_reason):
+                break
+            request = _build_continuation(request, full_response, max_tokens, call["continuations"])
+            if request is None:
+                break
+            call["continuations"] += 1
+
+        return _store_completion(cache_key, full_response)
+
+def stream_completion(prompt: str, system_message: str = "You are a helpful assistant.", model: Optional[str] = None, temperature: float = 0.3, max_tokens: Optional[int] = None, use_cache: bool = True) -> Iterator[str]:
+    """
+    Yield the completion as token deltas, continuing truncated responses like get_completion.
+    The full response is cached only once the stream has finished.
+    """
+    model = model or get_model()
+    cache_key = _get_cache_key(prompt, system_message, model, temperature, max_tokens, use_cache)
+    with track_call("stream", model, cache_key is not None) as call:
+        if cache_key:
+            cached_response = get_response_cache().get(cache_key)
+            if cached_response is not None:
+                call["cache"] = "hit"
+                yield cached_response
+                return
+
+        full_response = ""
+        request = _build_request(prompt, system_message, model, temperature, max_tokens)
+
+        while True:
+            current_response = ""
+            finish_reason = None
+            usage = None
+            with _get_request_slots():
+                # 只重试建立流的请求，已输出的增量无法撤回
+                stream = call_with_retries(lambda: get_client().chat.completions.create(stream=True, **request), get_transport_config(), stats=call)
+                for chunk in stream:
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    delta = choice.delta.content or ""
+                    if delta:
+                        mark_first_token(call)
+                        current_response += delta
+                        yield delta
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+            add_usage(call, usage, _request_text(request), current_response)
+
+            full_response += current_response.removesuffix(STOP_SEQUENCE)
+
+            if not _is_truncated(current_response, finish_reason):
+                break
+            request = _build_continuation(request, full_response, max_tokens, call["continuations"])
+            if request is None:
+                break
+            call["continuations"] += 1
+
+        _store_completion(cache_key, full_response)
+
+async def get_completion_async(prompt: str, system_message: str = "You are a helpful assistant.", model: Optional[str] = None, temperature: float = 0.3, max_tokens: Optional[int] = None, use_cache: bool = True) -> str:
+    """
+    asyncio counterpart of get_completion, limited to MAX_CONCURRENCY requests in flight per event loop.
+    """
+    model = model or get_model()
+    cache_key = _get_cache_key(prompt, system_message, model, temperature, max_tokens, use_cache)
+    with track_call("async", model, cache_key is not None) as call:
+        if cache_key:
+            cached_response = get_response_cache().get(cache_key)
+            if cached_response is not None:
+                call["cache"] = "hit"
+                return cached_response
+
+        async_client, slots = _get_async_state()
+        full_response = ""
+        request = _build_request(prompt, system_message, model, temperature, max_tokens)
+
+        while True:
+            async with slots:
+                response = await call_with_retries_async(lambda: async_client.chat.completions.create(**request), get_transport_config(), stats=call)
+
+            current_response = response.choices[0].message.content or ""
+            finish_reason = response.choices[0].finish_reason
+            add_usage(call, getattr(response, "usage", None), _request_text(request), current_response)
+
+            full_response += current_response.removesuffix(STOP_SEQUENCE)
+
+            if not _is_truncated(current_response, finish_reason):
+                break
+            request = _build_continuation(request, full_response, max_tokens, call["continuations"])
+            if request is None:
+                break
+            call["continuations"] += 1
+
+        return _store_completion(cache_key, full_response)
+
+async def gather_completions_async(prompts: List[str], **kwargs) -> List[str]:
+    """
+    Run get_completion_async for every prompt concurrently, returning responses in prompt order.
+    """
+    import asyncio
 
-    return full_response.strip()
+    # gather 创建的任务会复制当前上下文，从而继承调用方名称
+    with caller_scope(find_caller()):
+        return await asyncio.gather(*(get_completion_async(prompt, **kwargs) for prompt in prompts))
+
+def parallel_map(func: Callable, items: List[Any], max_workers: Optional[int] = None) -> List[Any]:
+    """
+    Apply func to every item on a thread pool and return the results in input order.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    items = list(items)
+    if not items:
+        return []
+    caller = find_caller()
+
+    def call_with_caller(item: Any) -> Any:
+        with caller_scope(caller):
+            return func(item)
+
+    with ThreadPoolExecutor(max_workers=max_workers or get_max_concurrency()) as executor:
+        return list(executor.map(call_with_caller, items))
+
+def get_completions(prompts: List[str], max_workers: Optional[int] = None, **kwargs) -> List[str]:
+    """
+    Blocking helper that fans out get_completion over a thread pool sharing the module client's connection pool.
+    """
+    return parallel_map(lambda prompt: get_completion(prompt, **kwargs), prompts, max_workers)
 
 def clean_file_content(content: str) -> str:
     lines = content.split('\n')
@@ -68,11 +400,229 @@ Return only the cleaned code content."""
     cleaned_code = get_completion(cleaning_prompt, system_message=system_message)
     return clean_file_content(cleaned_code)
 
+class StructuredOutputError(ValueError):
+    pass
+
+# 结构化输出的最大尝试次数（含首次请求），超出后抛出 StructuredOutputError
+JSON_MAX_ATTEMPTS = 2
+
+def repair_json(text: str) -> str:
+    """
+    Repair common defects in model-produced JSON locally: surrounding prose and code fences,
+    single-quoted strings, raw newlines inside strings, trailing commas and a truncated tail.
+    """
+    text = text.strip()
+    fence = re.search(r"```[\w-]*[ \t]*\n(.*?)(?:\n[ \t]*```|\Z)", text, re.DOTALL)
+    if fence:
+        text = fence.group(1)
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    out = []
+    closers = []
+    quote = None
+    escaped = False
+    for char in text:
+        if quote:
+            if escaped:
+                escaped = False
+                if char == "'" and quote == "'":
+                    out.pop()
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+                char = '"'
+            elif char == '"':
+                char = '\\"'
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+            continue
+        if char in "\"'":
+            quote = char
+            out.append('"')
+            continue
+        if char in "}]":
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if not closers:
+                break
+            char = closers.pop()
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        out.append(char)
+        if char in "}]" and not closers:
+            # 顶层值结束后的说明文字直接丢弃
+            break
+
+    # 截断的尾部：补全字符串、去掉悬空的逗号和键，再依次闭合括号
+    if quote:
+        if escaped:
+            out.pop()
+        out.append('"')
+    while out and out[-1] in " \t\r\n,":
+        out.pop()
+    if out and out[-1] == ":":
+        out.append("null")
+    out.extend(reversed(closers))
+    return "".join(out)
+
+def parse_json_response(response: str) -> Any:
+    """
+    Parse JSON from a model response, falling back to repair_json. Raises json.JSONDecodeError
+    when the response cannot be repaired.
+    """
+    try:
+        return json.loads(response)
+    except json.JSONDecodeError as e:
+        error = e
+    try:
+        return json.loads(repair_json(response), strict=False)
+    except json.JSONDecodeError:
+        raise error
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+def validate_schema(data: Any, schema: Optional[Dict], path: str = "$") -> Optional[str]:
+    """
+    Check data against a small JSON Schema subset (type, required, properties, items, enum).
+    Returns a description of the first violation, or None if the data is valid.
+    """
+    if not schema:
+        return None
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        is_bool = isinstance(data, bool)
+        if not any(isinstance(data, JSON_TYPES[t]) and (t == "boolean" or not is_bool) for t in types):
+            return f"{path} should be of type {' or '.join(types)}"
+    if "enum" in schema and data not in schema["enum"]:
+        return f"{path} should be one of {schema['enum']}"
+    if isinstance(data, dict):
+        for key in schema.get("required", []):
+            if key not in data:
+                return f"{path} is missing the required key '{key}'"
+        for key, subschema in schema.get("properties", {}).items():
+            if key in data:
+                error = validate_schema(data[key], subschema, f"{path}.{key}")
+                if error:
+                    return error
+    if isinstance(data, list) and "items" in schema:
+        for index, item in enumerate(data):
+            error = validate_schema(item, schema["items"], f"{path}[{index}]")
+            if error:
+                return error
+    return None
+
+def get_json_completion(prompt: str, system_message: str = "You are a helpful assistant.", schema: Optional[Dict] = None, model: Optional[str] = None, temperature: float = 0.3, max_tokens: Optional[int] = None, use_cache: bool = True, max_attempts: int = JSON_MAX_ATTEMPTS, backoff: float = 1.0, request_options: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Get a JSON value from the model. The response is repaired locally and validated against schema;
+    only if that fails is the model asked, with a short prompt that carries the invalid output and the
+    error instead of the full original prompt, to fix it. Raises StructuredOutputError after max_attempts.
+    """
+    response = get_completion(prompt, system_message=system_message, model=model, temperature=temperature, max_tokens=max_tokens, use_cache=use_cache, request_options=request_options)
+    for attempt in range(1, max_attempts + 1):
+        try:
+            data = parse_json_response(clean_file_content(response))
+            error = validate_schema(data, schema)
+        except json.JSONDecodeError as e:
+            error = f"invalid JSON: {e}"
+        if error is None:
+            return data
+        print(f"Structured output attempt {attempt}/{max_attempts} failed: {error}")
+        if attempt == max_attempts:
+            break
+        time.sleep(backoff * 2 ** (attempt - 1))
+        fix_prompt = f"""The following output should be JSON but is invalid: {error}
+
+Output:
+{response}
+
+JSON Schema:
+{json.dumps(schema, indent=2) if schema else "any valid JSON value"}
+
+Return only the corrected JSON without any explanation."""
+        response = get_completion(fix_prompt, system_message="You fix malformed JSON.", model=model, temperature=0, max_tokens=max_tokens, use_cache=use_cache, request_options=request_options)
+    raise StructuredOutputError(f"no valid JSON after {max_attempts} attempts: {error}")
+
+STRING_ARRAY_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
+def object_schema(properties: Dict[str, Dict]) -> Dict:
+    """
+    Schema of an object whose keys are all required.
+    """
+    return {"type": "object", "required": list(properties.keys()), "properties": properties}
+
+def get_structured_output_mode() -> str:
+    mode = get_structured_output()
+    if mode != "auto":
+        return mode
+    # Ollama 默认监听 11434 端口
+    return "ollama" if ":11434" in (getenv("PROVIDER") or "") else "json_schema"
+
+def structured_output_options(schema: Dict, name: str = "result") -> Dict[str, Any]:
+    """
+    Request options that make the backend constrain its output to schema.
+    """
+    mode = get_structured_output_mode()
+    if mode == "json_schema":
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": False}}}
+    if mode == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    if mode == "ollama":
+        return {"extra_body": {"format": schema}}
+    return {}
+
+# 后端拒绝结构化输出参数时，错误信息中会出现的字样
+STRUCTURED_OUTPUT_ERROR_MARKERS = ("response_format", "json_schema", "json_object", "structured output")
+
+def is_structured_output_error(error: Exception) -> bool:
+    """
+    Whether a 400 error rejects the structured output option itself, rather than the prompt (e.g. a context-length error).
+    """
+    if getattr(error, "param", None) in ("response_format", "format"):
+        return True
+    message = str(getattr(error, "message", "") or error).lower()
+    return any(marker in message for marker in STRUCTURED_OUTPUT_ERROR_MARKERS)
+
+def get_structured_completion(prompt: str, schema: Dict, system_message: str = "You are a helpful assistant.", name: str = "result", **kwargs) -> Any:
+    """
+    Get a parsed JSON object that follows schema, using the backend's native structured output
+    (response_format, or Ollama's format parameter) when available. If the backend rejects the
+    option itself, structured output is turned off for the rest of the run and the prompt is retried
+    with local repair and validation only; other errors are raised. Raises StructuredOutputError like get_json_completion.
+    """
+    global STRUCTURED_OUTPUT
+    request_options = structured_output_options(schema, name)
+    try:
+        return get_json_completion(prompt, system_message=system_message, schema=schema, request_options=request_options, **kwargs)
+    except Exception as e:
+        import openai
+
+        if not (request_options and isinstance(e, openai.BadRequestError) and is_structured_output_error(e)):
+            raise
+        print(f"Structured output is not supported by the backend, falling back to plain JSON prompts: {e}")
+        STRUCTURED_OUTPUT = "none"
+        return get_json_completion(prompt, system_message=system_message, schema=schema, **kwargs)
+
+GEN_FILE_PATTERN = r"<gen-file path=['\"]?([^>]+?)['\"]?>\s*(.*?)\s*</gen-file>"
+GEN_FILE_CLOSE_TAG = "</gen-file>"
+
 def parse_design(design: str) -> Dict[str, str]:
     parsed_files = {}
 
-    file_pattern = r"<gen-file path=['\"]?([^>]+?)['\"]?>\s*(.*?)\s*</gen-file>"
-    matches = re.findall(file_pattern, design, re.DOTALL)
+    matches = re.findall(GEN_FILE_PATTERN, design, re.DOTALL)
 
     for match in matches:
         file_path = match[0].strip()
@@ -81,12 +631,104 @@ def parse_design(design: str) -> Dict[str, str]:
 
     return parsed_files
 
+class GenFileStreamParser:
+    """
+    Incrementally extract <gen-file path=...> blocks from streamed text.
+
+    Only the block currently being generated is buffered; each closed block is
+    returned from feed() as soon as its closing tag arrives.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._scan_from = 0
+
+    def feed(self, text: str) -> Dict[str, str]:
+        self._buffer += text
+        parsed_files = {}
+        while True:
+            close_index = self._buffer.find(GEN_FILE_CLOSE_TAG, self._scan_from)
+            if close_index == -1:
+                # 结束标签可能被拆分在两个增量之间，保留末尾用于下次查找
+                self._scan_from = max(0, len(self._buffer) - len(GEN_FILE_CLOSE_TAG))
+                return parsed_files
+            block_end = close_index + len(GEN_FILE_CLOSE_TAG)
+            parsed_files.update(parse_design(self._buffer[:block_end]))
+            self._buffer = self._buffer[block_end:]
+            self._scan_from = 0
+
+# 修改结果不是合法 JSON 时，用于在本地恢复文件内容的模式
+JSON_FILE_ENTRY_PATTERN = re.compile(r'"((?:[^"\\\n]|\\.)+)"\s*:\s*"((?:[^"\\]|\\.)*)"', re.DOTALL)
+FENCED_BLOCK_PATTERN = re.compile(r"```[ \t]*([^\n`]*)\n(.*?)\n[ \t]*```", re.DOTALL)
+FILE_PATH_PATTERN = re.compile(r"(?:[\w.\-]+/)*(?:[\w\-][\w.\-]*\.[A-Za-z][A-Za-z0-9]*|Makefile|Dockerfile)")
+
+def _decode_json_string(raw: str) -> str:
+    try:
+        return json.loads(f'"{raw}"', strict=False)
+    except ValueError:
+        return raw.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace('\\\\', '\\')
+
+def _find_file_path(text: str) -> Optional[str]:
+    paths = FILE_PATH_PATTERN.findall(text.replace("`", " ").replace("*", " "))
+    return paths[-1] if paths else None
+
+def recover_json_files(response: str) -> Dict[str, str]:
+    """
+    Recover "path": "content" pairs from a broken JSON response (trailing commas, missing braces,
+    raw newlines inside strings). A truncated last entry is dropped rather than written half-finished.
+    """
+    start = response.find('"files"')
+    if start == -1:
+        return {}
+    files = {}
+    for match in JSON_FILE_ENTRY_PATTERN.finditer(response, start + len('"files"')):
+        path = _decode_json_string(match.group(1)).strip()
+        if FILE_PATH_PATTERN.fullmatch(path):
+            files[path] = _decode_json_string(match.group(2))
+    return files
+
+def recover_fenced_files(response: str) -> Dict[str, str]:
+    """
+    Recover fenced code blocks whose path is given in the fence info string or on the line above the fence.
+    """
+    files = {}
+    for match in FENCED_BLOCK_PATTERN.finditer(response):
+        path = _find_file_path(match.group(1))
+        if path is None:
+            preceding = response[:match.start()].rstrip().rsplit("\n", 1)[-1]
+            path = _find_file_path(preceding)
+        if path:
+            files[path] = match.group(2)
+    return files
+
+def extract_files_from_response(response: str) -> Dict[str, str]:
+    """
+    Extract {path: content} from a model response without another model call. Tries, in order:
+    strict JSON, <gen-file> tags, tolerant recovery of broken JSON, and fenced code blocks.
+    """
+    try:
+        data = json.loads(clean_file_content(response))
+        files = data.get("files", {}) if isinstance(data, dict) else {}
+        if isinstance(files, dict) and files:
+            return files
+    except json.JSONDecodeError:
+        pass
+    for recover in (parse_design, recover_json_files, recover_fenced_files):
+        files = recover(response)
+        if files:
+            return files
+    return {}
+
 def filter_out_test_files(design: str) -> str:
     lines = design.splitlines()
     filtered_lines = [line for line in lines if "test" not in line.lower()]
     return "\n".join(filtered_lines)
 
 def get_skip_folders_and_file_extensions(language: str, libraries: List[str]) -> Tuple[List[str], List[str]]:
+    adapter = get_language_adapter(language)
+    if adapter is not None:
+        return list(adapter.skip_folders), list(adapter.file_extensions)
+
     system_message = "You are an expert software developer. Return only common build or output directories to skip and the file extensions to check during file processing."
 
     skip_and_ext_prompt = f"""
@@ -110,14 +752,11 @@ JSON Format Example:
     "file_extensions": A JSON array of file extensions to be checked (including test files)
 }}
 """
-    response = get_completion(skip_and_ext_prompt, system_message=system_message)
-    response = clean_file_content(response)
+    schema = object_schema({"skip_folders": STRING_ARRAY_SCHEMA, "file_extensions": STRING_ARRAY_SCHEMA})
     try:
-        data = json.loads(response)
-        skip_folders = data.get("skip_folders", [])
-        file_extensions = data.get("file_extensions", [])
-        return skip_folders, file_extensions
-    except json.JSONDecodeError as e:
+        data = get_structured_completion(skip_and_ext_prompt, schema, system_message=system_message, name="skip_folders_and_file_extensions")
+        return data["skip_folders"], data["file_extensions"]
+    except StructuredOutputError as e:
         print(f"A - L135 - JSON decode error: {e}")
         return [], []
     
@@ -140,14 +779,9 @@ def clean_base_path(base_path: str):
                 os.rmdir(os.path.join(root, name))
 
 def get_project_structure(base_path: str, skip_folders: List[str], file_extensions: List[str]) -> Dict[str, List[str]]:
-    project_structure = {}
-    for root, dirs, files in os.walk(base_path):
-        dirs[:] = [d for d in dirs if not any(os.path.join(root, d).startswith(os.path.join(base_path, skip_folder)) for skip_folder in skip_folders)]
-        relative_root = os.path.relpath(root, base_path)
-        project_structure[relative_root] = [file for file in files if any(file.endswith(ext) for ext in file_extensions)]
-    return project_structure
-
-def generate_project_settings(base_path, language: str, libraries: List[str], design: str, project_structure: Dict[str, List[str]]) -> str:
+    return build_project_structure(base_path, skip_folders, file_extensions)
+
+def generate_project_settings(base_path, language: str, libraries: List[str], design: str, project_structure: Dict[str, List[str]], use_cache: bool = True) -> str:
     system_message = "You are an expert in configuring project settings for software development."
 
     settings_prompt = f"""Based on the following technical design and the existing file structure, determine if a suitable project configuration file (like Cargo.toml for Rust, package.json for Node.js) already exists. If it does, skip generating a new one. If it doesn't exist, create an appropriate configuration file.
@@ -172,18 +806,17 @@ JSON Format Example:
 }}
 """
 
-    settings_content = get_completion(settings_prompt, system_message=system_message)
-    settings_content = clean_file_content(settings_content)
+    settings_schema = object_schema({"project_file": {"type": "string"}, "settings_content": {"type": "string"}})
     try:
-        data = json.loads(settings_content)
-        project_file = data.get("project_file", "")
-        settings_content = data.get("settings_content", "")
-        with open(os.path.join(base_path, project_file), "w") as f:
-            f.write(settings_content)
-        print(f"Writed file: {base_path}/{project_file}")
-    except json.JSONDecodeError as e:
-        print(f"generate_project_settings - JSON decode error: {e}")
-        generate_project_settings(base_path, language, libraries, design, project_structure)
+        data = get_structured_completion(settings_prompt, settings_schema, system_message=system_message, name="project_settings", use_cache=use_cache)
+    except StructuredOutputError as e:
+        print(f"generate_project_settings - {e}")
+        return
+    project_file = data.get("project_file", "")
+    settings_content = data.get("settings_content", "")
+    with open(os.path.join(base_path, project_file), "w") as f:
+        f.write(settings_content)
+    print(f"Writed file: {base_path}/{project_file}")
 
 def validate_paths(suggested_paths: Dict[str, str], base_path: str, project_structure: Dict[str, List[str]]) -> Dict[str, str]:
     """
@@ -228,9 +861,16 @@ def read_existing_documents(base_path: str) -> Tuple[str, str]:
     
     return readme_content, design_content
 
-def load_file_content(base_path: str, file_list: List[str]) -> str:
+def load_file_content(base_path: str, file_list: List[str], project_index=None) -> Dict[str, str]:
     files_content = {}
     for file_path in file_list:
+        if project_index is not None:
+            content = project_index.read(file_path)
+            if content is None:
+                print(f"File {os.path.join(base_path, file_path)} does not exist, skipping.")
+            else:
+                files_content[file_path] = content
+            continue
         full_path = os.path.join(base_path, file_path)
         full_path = full_path.replace(f"{base_path}/{base_path}", base_path)
         if not os.path.exists(full_path):
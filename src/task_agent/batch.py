@@ -0,0 +1,197 @@
+import os
+import sys
+import glob
+import json
+import time
+import traceback
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Optional, Any
+
+# 批量运行多个项目：每个项目在独立的工作进程中执行完整流程，所有进程共享一个 LLM 并发上限
+
+
+def find_project_configs(sources: List[str]) -> List[str]:
+    """
+    Expand the batch inputs into project config files. A source is a project config (.toml like agent.toml),
+    a directory of them, or a manifest listing one config path per line (relative to the manifest).
+    """
+    configs = []
+    for source in sources:
+        if os.path.isdir(source):
+            configs.extend(sorted(glob.glob(os.path.join(source, "*.toml"))))
+        elif source.endswith(".toml"):
+            configs.append(source)
+        else:
+            with open(source, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split("#", 1)[0].strip()
+                    if line:
+                        configs.append(os.path.join(os.path.dirname(source), line))
+    return [os.path.abspath(config) for config in dict.fromkeys(configs)]
+
+
+def load_project_config(config_path: str) -> Dict[str, Any]:
+    import toml
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = toml.load(f)
+    project = config["project"]
+    # 相对路径以配置文件所在目录为准，避免不同项目写入同一目录
+    project["base_path"] = os.path.join(os.path.dirname(config_path), project.get("base_path") or os.path.splitext(os.path.basename(config_path))[0])
+    return config
+
+
+def project_name(config_path: str) -> str:
+    return os.path.splitext(os.path.basename(config_path))[0]
+
+
+@contextmanager
+def redirect_output(log_path: str):
+    """
+    Send everything written to stdout and stderr, including by subprocesses, to log_path.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout, saved_stderr = os.dup(1), os.dup(2)
+    with open(log_path, 'a', encoding='utf-8') as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_stdout, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stdout)
+            os.close(saved_stderr)
+
+
+def init_worker(request_slots) -> None:
+    from .agent import set_request_slots
+
+    set_request_slots(request_slots)
+    # 各项目的调用记录单独写入日志目录，不混入共享的默认日志
+    os.environ["CALL_LOG"] = "none"
+
+
+def run_project(config_path: str, log_dir: str, resume: bool = False) -> Dict[str, Any]:
+    """
+    Run senior developer -> QA engineer -> developer for one project config in this process,
+    logging to <log_dir>/<name>.log and <name>.calls.jsonl. Returns the project's report row.
+    """
+    from . import senior_developer_agent, qa_engineer_agent, developer_agent, configure_transport
+    from .instrumentation import add_hook, remove_hook, JsonlSink
+    from .checkpoint import load_checkpoint
+
+    name = project_name(config_path)
+    log_path = os.path.join(log_dir, f"{name}.log")
+    records = []
+    call_log = JsonlSink(os.path.join(log_dir, f"{name}.calls.jsonl"))
+
+    def collect(record: Dict[str, Any]) -> None:
+        records.append(record)
+        call_log(record)
+
+    row = {"project": name, "config": config_path, "log": log_path, "status": "error", "error": None}
+    start = time.perf_counter()
+    add_hook(collect)
+    try:
+        with redirect_output(log_path):
+            try:
+                config = load_project_config(config_path)
+                project = config["project"]
+                agent_options = config.get("agent", {})
+                base_path = project["base_path"]
+                row["base_path"] = base_path
+                args = (project["requirement"], project["language"], project["libraries"], base_path, project["comment_language"], project["readme_language"])
+                configure_transport(**config.get("llm", {}))
+
+                if not (resume and load_checkpoint(base_path)):
+                    senior_developer_agent(*args, generation_mode=agent_options.get("generation_mode", "batch"), design_candidates=agent_options.get("design_candidates", 1), design_top_k=agent_options.get("design_top_k", 1))
+                    qa_engineer_agent(*args)
+                developer_agent(*args, edit_mode=agent_options.get("edit_mode", "full"), resume=resume)
+
+                checkpoint = load_checkpoint(base_path) or {}
+                row["status"] = "completed" if checkpoint.get("phase") == "completed" else "unfinished"
+                row["iterations"] = checkpoint.get("improve_loop_count")
+            except Exception as e:
+                traceback.print_exc()
+                row["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        remove_hook(collect)
+
+    row["wall_time"] = round(time.perf_counter() - start, 2)
+    row["calls"] = len(records)
+    row["prompt_tokens"] = sum(record["prompt_tokens"] for record in records)
+    row["completion_tokens"] = sum(record["completion_tokens"] for record in records)
+    return row
+
+
+def run_batch(config_paths: List[str], log_dir: str, workers: Optional[int] = None, max_llm_concurrency: int = 8, resume: bool = False) -> Dict[str, Any]:
+    """
+    Run every project in a process pool. At most max_llm_concurrency completion requests are in flight
+    across all workers, so throughput scales with cores up to the provider quota.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(config_paths)))
+    request_slots = multiprocessing.BoundedSemaphore(max_llm_concurrency)
+    rows = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(request_slots,)) as executor:
+        futures = {executor.submit(run_project, config_path, log_dir, resume): config_path for config_path in config_paths}
+        for future in as_completed(futures):
+            config_path = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                # 工作进程异常退出时仍然记录该项目
+                row = {"project": project_name(config_path), "config": config_path, "status": "error", "error": f"{type(e).__name__}: {e}", "wall_time": 0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            rows.append(row)
+            print(f"[{len(rows)}/{len(config_paths)}] {row['project']}: {row['status']} in {row['wall_time']:.0f}s ({row['calls']} LLM calls)")
+
+    rows.sort(key=lambda row: row["project"])
+    wall_time = time.perf_counter() - start
+    project_time = sum(row["wall_time"] for row in rows)
+    return {
+        "projects": rows,
+        "workers": workers,
+        "max_llm_concurrency": max_llm_concurrency,
+        "wall_time": round(wall_time, 2),
+        "project_time": round(project_time, 2),
+        "speedup": round(project_time / wall_time, 2) if wall_time else None,
+        "completed": sum(row["status"] == "completed" for row in rows),
+        "calls": sum(row["calls"] for row in rows),
+        "prompt_tokens": sum(row["prompt_tokens"] for row in rows),
+        "completion_tokens": sum(row["completion_tokens"] for row in rows),
+    }
+
+
+def format_batch_report(report: Dict[str, Any]) -> str:
+    header = f"{'project':<32}{'status':>12}{'wall s':>9}{'iter':>6}{'calls':>7}{'prompt tok':>12}{'compl tok':>11}"
+    lines = [header, "-" * len(header)]
+    for row in report["projects"]:
+        iterations = row.get("iterations")
+        lines.append(
+            f"{row['project'][:31]:<32}{row['status']:>12}{row['wall_time']:>9.1f}{iterations if iterations is not None else '-':>6}"
+            f"{row['calls']:>7}{row['prompt_tokens']:>12}{row['completion_tokens']:>11}"
+        )
+        if row.get("error"):
+            lines.append(f"  {row['error']}")
+    lines.append("-" * len(header))
+    lines.append(
+        f"{len(report['projects'])} projects, {report['completed']} completed, {report['calls']} LLM calls, "
+        f"{report['prompt_tokens'] + report['completion_tokens']} tokens"
+    )
+    lines.append(
+        f"wall time {report['wall_time']:.1f}s for {report['project_time']:.1f}s of project time "
+        f"(x{report['speedup']} with {report['workers']} workers, at most {report['max_llm_concurrency']} LLM requests in flight)"
+    )
+    return "\n".join(lines)
+
+
+def save_batch_report(report: Dict[str, Any], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,287 @@
+import os
+import json
+import math
+from typing import List, Dict, Tuple, Optional, Callable, Any
+from .config import getenv
+
+# 常见模型的上下文窗口大小（token 数），按名称前缀匹配
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 128000,
+    "llama3.1": 128000,
+    "llama3.2": 128000,
+    "llama3": 8192,
+    "qwen2.5": 32768,
+    "mistral": 32768,
+    "codellama": 16384,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+# 单次响应的输出上限，按名称前缀匹配；本地模型只受上下文窗口限制
+OUTPUT_LIMITS = {
+    "gpt-4o": 16384,
+    "gpt-4-turbo": 4096,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 4096,
+    "o1": 32768,
+    "llama3": None,
+    "qwen2.5": None,
+    "mistral": None,
+    "codellama": None,
+}
+DEFAULT_OUTPUT_LIMIT = 4096
+# 裁剪提示词时每个部分至少保留的 token 数，以及重新分配超出部分的最多轮数
+MIN_SECTION_TOKENS = 256
+FIT_ROUNDS = 3
+# 每条消息的角色与分隔符大约占用的 token 数
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encodings = {}
+
+class ApproximateEncoding:
+    """
+    Fallback used when tiktoken cannot load an encoding (e.g. offline): one token per 4 characters.
+    """
+    chars_per_token = 4
+
+    def encode(self, text: str, disallowed_special=()) -> List[str]:
+        step = self.chars_per_token
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+def register_context_window(model: str, tokens: int) -> None:
+    CONTEXT_WINDOWS[model] = tokens
+
+def get_context_window(model: Optional[str]) -> int:
+    """
+    Return the context window for the model. MAX_CONTEXT_TOKENS in the environment overrides the table.
+    """
+    override = getenv("MAX_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    prefix = _match_prefix(CONTEXT_WINDOWS, model)
+    if prefix is None:
+        return DEFAULT_CONTEXT_WINDOW
+    return CONTEXT_WINDOWS[prefix]
+
+def _match_prefix(table: Dict[str, Any], model: Optional[str]) -> Optional[str]:
+    name = (model or "").lower()
+    matches = [prefix for prefix in table if name.startswith(prefix)]
+    return max(matches, key=len) if matches else None
+
+def get_output_limit(model: Optional[str]) -> int:
+    """
+    Return the most tokens the model may generate in one response. MAX_OUTPUT_TOKENS in the environment overrides the table.
+    """
+    override = getenv("MAX_OUTPUT_TOKENS")
+    if override:
+        return int(override)
+    prefix = _match_prefix(OUTPUT_LIMITS, model)
+    if prefix is None:
+        return DEFAULT_OUTPUT_LIMIT
+    return OUTPUT_LIMITS[prefix] or get_context_window(model)
+
+def get_prompt_budget(model: Optional[str], reserved_tokens: int = 2048) -> int:
+    return max(get_context_window(model) - reserved_tokens, 0)
+
+def _get_encoding(model: Optional[str]):
+    key = model or ""
+    if key not in _encodings:
+        try:
+            import tiktoken
+
+            try:
+                _encodings[key] = tiktoken.encoding_for_model(key)
+            except KeyError:
+                _encodings[key] = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"tiktoken encoding unavailable ({e}), falling back to approximate token counts.")
+            _encodings[key] = ApproximateEncoding()
+    return _encodings[key]
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: Optional[str] = None) -> int:
+    return sum(count_tokens(str(message.get("content") or ""), model) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def get_max_output_tokens(model: Optional[str], prompt_tokens: int) -> int:
+    """
+    Room left for the response: the model's output limit, capped by what the prompt leaves of the context window.
+    """
+    return max(min(get_output_limit(model), get_context_window(model) - prompt_tokens - MESSAGE_OVERHEAD_TOKENS), 0)
+
+def trim_head_tail(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    Keep the beginning and the end of the text, replacing the middle with an omission marker.
+    """
+    encoding = _get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    marker = "\n... [{} tokens omitted] ...\n"
+    keep = max(max_tokens - count_tokens(marker.format(len(tokens)), model), 0)
+    head = keep // 2
+    tail = keep - head
+    omitted = len(tokens) - head - tail
+    return encoding.decode(tokens[:head]) + marker.format(omitted) + (encoding.decode(tokens[-tail:]) if tail else "")
+
+def _relevance(path: str, relevance_text: str) -> int:
+    return relevance_text.count(path) * 2 + relevance_text.count(os.path.basename(path))
+
+def trim_files(files: Dict[str, str], max_tokens: int, relevance_text: str = "", model: Optional[str] = None) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Drop the least relevant files (those least mentioned in relevance_text, larger first) until the
+    rendered JSON fits max_tokens. Returns the kept files and the dropped paths.
+    """
+    kept = dict(files)
+    dropped = []
+    file_tokens = {path: count_tokens(json.dumps({path: content}, indent=2), model) for path, content in files.items()}
+    total = sum(file_tokens.values())
+    ranked = sorted(files, key=lambda path: (_relevance(path, relevance_text), -file_tokens[path]))
+    for path in ranked:
+        if total <= max_tokens or len(kept) == 1:
+            break
+        del kept[path]
+        dropped.append(path)
+        total -= file_tokens[path]
+    if len(kept) == 1 and count_tokens(json.dumps(kept, indent=2), model) > max_tokens:
+        path = next(iter(kept))
+        kept[path] = trim_head_tail(kept[path], max_tokens, model)
+    return kept, dropped
+
+def structure_depth(folder: str) -> int:
+    return 0 if folder in (".", "") else folder.count(os.sep) + 1
+
+def trim_structure(structure: Dict[str, List[str]], max_tokens: int, model: Optional[str] = None) -> Tuple[Dict[str, List[str]], int]:
+    """
+    Reduce the depth of the project structure until it fits. Returns the trimmed structure and the depth kept.
+    """
+    depth = max((structure_depth(folder) for folder in structure), default=0)
+    trimmed = structure
+    while depth > 0 and count_tokens(json.dumps(trimmed, indent=2), model) > max_tokens:
+        depth -= 1
+        trimmed = {folder: files for folder, files in structure.items() if structure_depth(folder) <= depth}
+    return trimmed, depth
+
+def trim_list(items: List[str], max_tokens: int, relevance_text: str = "", model: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    ranked = sorted(items, key=lambda item: -_relevance(item, relevance_text))
+    kept = []
+    for item in ranked:
+        if count_tokens(str(kept + [item]), model) > max_tokens:
+            break
+        kept.append(item)
+    kept_set = set(kept)
+    return [item for item in items if item in kept_set], [item for item in items if item not in kept_set]
+
+def render_section(section: Dict[str, Any]) -> str:
+    kind = section.get("kind", "text")
+    value = section["value"]
+    if kind in ("files", "structure", "json"):
+        return json.dumps(value, indent=2)
+    if kind == "list":
+        return str(value)
+    return value
+
+def _trim_section(section: Dict[str, Any], max_tokens: int, model: Optional[str]) -> Tuple[str, str]:
+    kind = section.get("kind", "text")
+    value = section["value"]
+    relevance_text = section.get("relevance", "")
+    if kind == "files":
+        kept, dropped = trim_files(value, max_tokens, relevance_text, model)
+        return json.dumps(kept, indent=2), f"dropped files: {', '.join(dropped) or 'none'}"
+    if kind == "structure":
+        trimmed, depth = trim_structure(value, max_tokens, model)
+        rendered = json.dumps(trimmed, indent=2)
+        if count_tokens(rendered, model) > max_tokens:
+            rendered = trim_head_tail(rendered, max_tokens, model)
+        return rendered, f"structure depth limited to {depth}"
+    if kind == "list":
+        kept, dropped = trim_list(value, max_tokens, relevance_text, model)
+        return str(kept), f"dropped {len(dropped)} entries"
+    return trim_head_tail(render_section(section), max_tokens, model), "kept head and tail"
+
+def _allocate_cuts(sizes: List[int], floors: List[int], weights: List[float], overflow: int) -> List[int]:
+    """
+    Split the overflow across sections in proportion to size * weight, never cutting a section below its floor.
+    Whatever a capped section cannot absorb is shared among the others.
+    """
+    cuts = [0] * len(sizes)
+    while overflow > 0:
+        open_sections = [i for i in range(len(sizes)) if sizes[i] - floors[i] - cuts[i] > 0]
+        if not open_sections:
+            break
+        total_weight = sum(sizes[i] * weights[i] for i in open_sections)
+        distributed = 0
+        for i in open_sections:
+            share = math.ceil(overflow * sizes[i] * weights[i] / total_weight)
+            cut = min(max(share, 1), sizes[i] - floors[i] - cuts[i], overflow - distributed)
+            cuts[i] += cut
+            distributed += cut
+            if distributed >= overflow:
+                break
+        overflow -= distributed
+    return cuts
+
+def fit_prompt(render: Callable[..., str], sections: List[Dict[str, Any]], model: Optional[str] = None, reserved_tokens: int = 2048, label: str = "prompt") -> str:
+    """
+    Render a prompt whose sections are trimmed to fit the model's context window.
+
+    `sections` are dicts with "name", "value", "kind" ("text", "files", "structure", "list" or "json")
+    and an optional "relevance" text, listed from least to most important. The overflow is split across
+    the sections in proportion to their size and a priority weight (optional "weight", by default higher
+    for the less important ones), and each keeps at least "min_tokens" (default MIN_SECTION_TOKENS).
+    `render` receives the rendered sections as keyword arguments and returns the full prompt.
+    """
+    rendered = {section["name"]: render_section(section) for section in sections}
+    budget = get_prompt_budget(model, reserved_tokens)
+    prompt = render(**rendered)
+    total = count_tokens(prompt, model)
+    if total <= budget:
+        return prompt
+
+    names = [section["name"] for section in sections]
+    original_sizes = [count_tokens(rendered[name], model) for name in names]
+    weights = [section.get("weight", len(sections) - index) for index, section in enumerate(sections)]
+    floors = [min(size, section.get("min_tokens", MIN_SECTION_TOKENS)) for size, section in zip(original_sizes, sections)]
+    # 固定文本加上各部分的保底仍超出预算时，按比例降低保底
+    fixed_tokens = total - sum(original_sizes)
+    room = max(budget - fixed_tokens, 0)
+    floor_total = sum(floors)
+    if floor_total > room:
+        floors = [floor * room // floor_total for floor in floors]
+
+    details = {}
+    for _ in range(FIT_ROUNDS):
+        if total <= budget:
+            break
+        sizes = [count_tokens(rendered[name], model) for name in names]
+        cuts = _allocate_cuts(sizes, floors, weights, total - budget)
+        if not any(cuts):
+            break
+        for index, section in enumerate(sections):
+            if cuts[index]:
+                target = sizes[index] - cuts[index]
+                trimmed, detail = _trim_section(section, target, model)
+                # 渲染后的 JSON 会因转义比裁剪目标略长，按超出量再裁剪一次
+                excess = count_tokens(trimmed, model) - target
+                if excess > 0 and target > excess:
+                    trimmed, detail = _trim_section(section, target - excess, model)
+                rendered[names[index]], details[names[index]] = trimmed, detail
+        prompt = render(**rendered)
+        total = count_tokens(prompt, model)
+
+    for index, name in enumerate(names):
+        size = count_tokens(rendered[name], model)
+        if size < original_sizes[index]:
+            print(f"Prompt budget ({label}): trimmed '{name}' from {original_sizes[index]} to {size} tokens, {details[name]}.")
+
+    if total > budget:
+        print(f"Prompt budget ({label}): still {total} tokens after trimming, budget is {budget}.")
+    return prompt
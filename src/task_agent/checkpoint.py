@@ -0,0 +1,53 @@
+import os
+import json
+import hashlib
+import tempfile
+from typing import Dict, Optional
+from .config import getenv
+
+# 为 None 时从 .env 的 CHECKPOINT_DIR 读取
+CHECKPOINT_DIR = None
+
+def get_checkpoint_dir() -> str:
+    return CHECKPOINT_DIR or getenv("CHECKPOINT_DIR", ".tdd_agents/checkpoints")
+
+def checkpoint_path(base_path: str) -> str:
+    absolute_path = os.path.abspath(base_path)
+    digest = hashlib.sha1(absolute_path.encode("utf-8")).hexdigest()[:12]
+    name = os.path.basename(absolute_path.rstrip(os.sep)) or "project"
+    return os.path.join(get_checkpoint_dir(), f"{name}-{digest}.json")
+
+def save_checkpoint(base_path: str, state: Dict) -> None:
+    """
+    Atomically write the checkpoint for base_path: the state is written to a temporary file
+    in the same folder and then renamed over the previous checkpoint.
+    """
+    path = checkpoint_path(base_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_checkpoint(base_path: str) -> Optional[Dict]:
+    path = checkpoint_path(base_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable checkpoint {path}: {e}")
+        return None
+
+def clear_checkpoint(base_path: str) -> None:
+    path = checkpoint_path(base_path)
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,17 +1,40 @@
 import os, sys
+import re
+import time
+import queue
+import signal
+import threading
+from collections import deque
+import shutil
+import tempfile
 import subprocess
-from typing import List, Dict, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Union, Optional
 import json
 from .agent import get_completion, clean_file_content, clean_code_with_openai, read_existing_documents
-from .agent import get_skip_folders_and_file_extensions, get_all_files_in_base_path
-from .agent import get_project_structure, generate_project_settings, load_file_content
+from .agent import get_skip_folders_and_file_extensions
+from .agent import generate_project_settings, load_file_content, parse_design, extract_files_from_response, get_model
+from .agent import get_structured_completion, object_schema, STRING_ARRAY_SCHEMA, StructuredOutputError
+from .budget import fit_prompt
+from .project_index import ProjectIndex
+from .languages import get_language_adapter
+from .checkpoint import save_checkpoint, load_checkpoint
+from .patching import parse_edits, apply_edit, PatchError
+from .test_parsers import parse_test_output, count_errors, categorize_diagnostics, files_from_diagnostics, has_dependency_errors, fingerprint_test_output
+from .test_parsers import count_reported_failures, exited_with_failure
+from .instrumentation import report_calls
 
 improvement_context = {}
 
 def categorize_errors(test_results: str) -> Dict[str, List[str]]:
     """
     Categorize the errors from the test results for prioritization.
+    Known output formats are categorized locally; the LLM is only used for unknown formats.
     """
+    diagnostics = parse_test_output(test_results)
+    if diagnostics is not None:
+        return categorize_diagnostics(diagnostics)
+
     system_message = "You are a Rust expert. Categorize the following errors based on their severity, potential impact, and the likelihood of causing other errors."
 
     categorize_prompt = f"""Categorize the following errors into groups based on severity, potential impact, and the likelihood of causing other errors.
@@ -28,16 +51,15 @@ JSON Format Example:
     "low": A JSON array of low severity errors
 }}
 """
-    response = get_completion(categorize_prompt, system_message=system_message)
-    response = clean_file_content(response)
+    schema = object_schema({severity: STRING_ARRAY_SCHEMA for severity in ("critical", "high", "medium", "low")})
     try:
-        categorized_errors = json.loads(response)
+        categorized_errors = get_structured_completion(categorize_prompt, schema, system_message=system_message, name="categorized_errors")
         return categorized_errors
-    except json.JSONDecodeError as e:
+    except StructuredOutputError as e:
         print(f"DA - L33 - JSON decode error: {e}")
         return {}
 
-def read_project_files(master_context: Dict) -> Dict[str, str]:
+def read_project_files(master_context: Dict, generate_settings: bool = True) -> Dict[str, str]:
     base_path = master_context.get("base_path", "")
     language = master_context.get("language", "")
     libraries = master_context.get("libraries", [])
@@ -45,16 +67,17 @@ def read_project_files(master_context: Dict) -> Dict[str, str]:
     design = master_context.get("technical_design", "")
     skip_folders = master_context.get("skip_folders", [])
     file_extensions = master_context.get("file_extensions", [])
+    project_index = master_context.get("project_index") or ProjectIndex(base_path, skip_folders, file_extensions)
+
+    all_files = project_index.files()
+
+    adapter = get_language_adapter(language)
+    project_file = adapter.find_config_file(all_files) if adapter else None
+    if project_file:
+        content = project_index.read(project_file)
+        if content is not None:
+            return {project_file: content}
 
-    all_files = []
-    for root, _, files in os.walk(base_path):
-        for file in files:
-            # skip files in the specified folders            
-            if any(os.path.join(root, file).startswith(os.path.join(base_path, skip_folder)) for skip_folder in skip_folders):
-                continue
-            file_path = os.path.relpath(os.path.join(root, file), base_path)
-            all_files.append(file_path)
-    
     system_message = "You are an expert software developer. Based on the provided list of files and the specified programming language, identify which file is the main project configuration file (e.g., Cargo.toml for Rust, package.json for JavaScript)."
 
     identification_prompt = f"""Given the following list of files and the specified programming language, identify the main project configuration file that defines dependencies, scripts, or other project settings.
@@ -70,30 +93,38 @@ JSON Format Example:
     "project_file": "file_name" 
 }}
 """
-    project_file_response = get_completion(identification_prompt, system_message=system_message)
-    project_file_response = clean_file_content(project_file_response).strip()
+    project_file_schema = object_schema({"project_file": {"type": ["string", "null"]}})
+    try:
+        project_file_data = get_structured_completion(identification_prompt, project_file_schema, system_message=system_message, name="project_file")
+    except StructuredOutputError as e:
+        print(f"read_project_files - {e}")
+        return {}
 
     project_files = {}
-    try:
-        project_file_data = json.loads(project_file_response)
-        project_file = project_file_data.get("project_file")
-        if project_file and project_file in all_files:
-            full_path = os.path.join(base_path, project_file)
-            full_path = full_path.replace(f"{base_path}/{base_path}", base_path)
-            if os.path.exists(full_path):
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    project_files[project_file] = f.read()
-        else:
-            print(f"Warning: Could not identify a valid project configuration file for {language}.")
-            generate_project_settings(base_path, language, libraries, design, project_structure)
-            return read_project_files(master_context)
-    except json.JSONDecodeError as e:
-        print(f"DA - L76 - JSON decode error: {e}")
-    
+    project_file = project_file_data.get("project_file")
+    if project_file and project_file in all_files:
+        content = project_index.read(project_file)
+        if content is not None:
+            project_files[project_file] = content
+    elif generate_settings:
+        print(f"Warning: Could not identify a valid project configuration file for {language}.")
+        generate_project_settings(base_path, language, libraries, design, project_structure)
+        project_index.refresh()
+        master_context["project_index"] = project_index
+        # 只生成一次配置文件，避免无限递归
+        return read_project_files(master_context, generate_settings=False)
+    else:
+        print(f"Warning: Could not identify a valid project configuration file for {language}.")
+
     return project_files
 
-def reload_project_files(base_path: str, project_files: Dict[str, str]) -> Dict[str, str]:
+def reload_project_files(base_path: str, project_files: Dict[str, str], project_index: Optional[ProjectIndex] = None) -> Dict[str, str]:
     for project_file, _ in project_files.items():
+        if project_index is not None:
+            content = project_index.read(project_file)
+            if content is not None:
+                project_files[project_file] = content
+            continue
         full_path = os.path.join(base_path, project_file)
         full_path = full_path.replace(f"{base_path}/{base_path}", base_path)
         if os.path.exists(full_path):
@@ -129,16 +160,20 @@ JSON Format Example:
 }}
 """
 
-    extraction_response_1 = get_completion(extraction_prompt_1, system_message=system_message_1)
-    extraction_response_1 = clean_file_content(extraction_response_1)
-
+    schema_1 = object_schema({"test_files": STRING_ARRAY_SCHEMA, "test_execution_commands": STRING_ARRAY_SCHEMA})
     try:
-        extraction_data_1 = json.loads(extraction_response_1)
-        test_files = extraction_data_1.get("test_files", [])
-        test_execution_commands_from_docs = extraction_data_1.get("test_execution_commands", [])
-    except json.JSONDecodeError as e:
+        extraction_data_1 = get_structured_completion(extraction_prompt_1, schema_1, system_message=system_message_1, name="test_info")
+        test_files = extraction_data_1["test_files"]
+        test_execution_commands_from_docs = extraction_data_1["test_execution_commands"]
+    except StructuredOutputError as e:
         print(f"Error parsing the extraction response from design docs: {e}")
 
+    # Step 2: 已知语言直接使用适配器提供的测试命令，否则从项目文件结构中推测
+    adapter = get_language_adapter(master_context.get("language", ""))
+    if adapter is not None:
+        test_execution_commands_from_structure = [command for command in adapter.test_commands if command not in test_execution_commands_from_docs]
+        return test_files, list(dict.fromkeys(test_execution_commands_from_docs + test_execution_commands_from_structure))
+
     # Step 2: 从项目文件结构中推测可能的测试命令，并确保与设计文档命令不重复
     system_message_2 = "You are an expert test engineer. Based on the project structure, predict possible test execution commands."
     
@@ -163,39 +198,150 @@ JSON Format Example:
 }}
 """
 
-    extraction_response_2 = get_completion(extraction_prompt_2, system_message=system_message_2)
-    extraction_response_2 = clean_file_content(extraction_response_2)
-
+    schema_2 = object_schema({"test_execution_commands": STRING_ARRAY_SCHEMA})
     try:
-        extraction_data_2 = json.loads(extraction_response_2)
-        test_execution_commands_from_structure = extraction_data_2.get("test_execution_commands", [])
-    except json.JSONDecodeError as e:
+        extraction_data_2 = get_structured_completion(extraction_prompt_2, schema_2, system_message=system_message_2, name="test_execution_commands")
+        test_execution_commands_from_structure = extraction_data_2["test_execution_commands"]
+    except StructuredOutputError as e:
         print(f"Error parsing the extraction response from project structure: {e}")
         test_execution_commands_from_structure = []
 
     combined_test_execution_commands = list(set(test_execution_commands_from_docs + test_execution_commands_from_structure))
     return test_files, combined_test_execution_commands
 
-def execute_tests(test_command: str, base_path: str) -> str:
+def get_stop_patterns(language: str) -> List[str]:
+    adapter = get_language_adapter(language)
+    return list(adapter.stop_patterns) if adapter else []
+
+def kill_process_group(process: subprocess.Popen) -> None:
     try:
-        # print(test_command, base_path)
-        result = subprocess.run(
-            test_command,
-            cwd=base_path,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=300  # Set timeout to 5 minutes
-        )
-        test_output = result.stdout + "\n" + result.stderr
-        with open(os.path.join(base_path, "TEST_RESULTS.txt"), 'w', encoding='utf-8') as f:
-            f.write(test_output)
-        return test_output
-    except subprocess.TimeoutExpired:
-        return "Test execution timed out."
-
-def analyze_test_results(improvement_context: Dict) -> Tuple[int, List[str], List[str], Dict[str, List[str]]]:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def execute_tests(test_command: str, base_path: str, timeout: float = 300, stop_patterns: Optional[List[str]] = None, max_output_lines: int = 2000, stop_grace: float = 2.0) -> str:
+    """
+    Run the test command, streaming its output line by line into TEST_RESULTS.txt.
+
+    Only the first and last max_output_lines / 2 lines are kept in memory and returned. When a line
+    matches one of stop_patterns, output is still collected for stop_grace seconds so the rest of the
+    diagnostics arrive, then the whole process group is killed.
+    """
+    stop_regexes = [re.compile(pattern) for pattern in stop_patterns or []]
+    process = subprocess.Popen(
+        test_command,
+        cwd=base_path,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        start_new_session=True,
+    )
+
+    lines = queue.Queue()
+
+    def read_output() -> None:
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    threading.Thread(target=read_output, daemon=True).start()
+
+    head_lines = []
+    tail_lines = deque(maxlen=max_output_lines - max_output_lines // 2)
+    omitted_lines = 0
+    deadline = time.time() + timeout
+    stop_at = None
+    status = None
+
+    with open(os.path.join(base_path, "TEST_RESULTS.txt"), 'w', encoding='utf-8', buffering=1) as f:
+        while True:
+            wait_until = min(deadline, stop_at) if stop_at else deadline
+            try:
+                line = lines.get(timeout=max(wait_until - time.time(), 0))
+            except queue.Empty:
+                # 匹配到停止模式后一律视为主动停止，即使宽限期被截止时间截短
+                status = "stopped" if stop_at else "timeout"
+                break
+            if line is None:
+                break
+
+            f.write(line)
+            if len(line) > 4000:
+                line = line[:4000] + "...\n"
+            if len(head_lines) < max_output_lines // 2:
+                head_lines.append(line)
+            else:
+                if len(tail_lines) == tail_lines.maxlen:
+                    omitted_lines += 1
+                tail_lines.append(line)
+
+            if stop_at is None and any(regex.search(line) for regex in stop_regexes):
+                stop_at = min(time.time() + stop_grace, deadline)
+
+        if status:
+            kill_process_group(process)
+        process.wait()
+
+        notes = []
+        if status == "timeout":
+            notes.append("Test execution timed out.")
+        elif status == "stopped":
+            notes.append("Test execution stopped early after a fatal error.")
+        elif process.returncode:
+            # 退出状态一并记录，解析不到任何错误时据此判断测试是否真的通过
+            notes.append(f"Test command exited with status {process.returncode}.")
+        for note in notes:
+            f.write(f"\n{note}\n")
+
+    test_output = "".join(head_lines)
+    if omitted_lines:
+        test_output += f"... [{omitted_lines} lines omitted, see TEST_RESULTS.txt] ...\n"
+    test_output += "".join(tail_lines)
+    for note in notes:
+        test_output += f"\n{note}"
+    return test_output
+
+def analyze_test_results_locally(improvement_context: Dict) -> bool:
+    """
+    Fill error_count, files_to_modify, configuration_files_to_modify and categorized_errors from
+    diagnostics parsed out of the test output. Returns False when the output format is unknown, the
+    affected files cannot be located, or the summary or exit status reports failures that were not
+    parsed, so the LLM analysis is needed.
+    """
+    base_path = improvement_context.get("base_path", "")
+    project_files = improvement_context.get("project_files", {})
+    test_results = improvement_context.get("test_results", "")
+
+    diagnostics = parse_test_output(test_results)
+    if diagnostics is None:
+        return False
+
+    error_count = count_errors(diagnostics)
+    # 汇总行或退出状态报告了失败却没有解析出错误时，交给 LLM 分析，不能当作通过
+    reported_failures = count_reported_failures(test_results)
+    if error_count == 0 and (reported_failures or exited_with_failure(test_results)):
+        return False
+    error_count = max(error_count, reported_failures)
+    files_to_modify = files_from_diagnostics(diagnostics, base_path)
+    if error_count > 0 and not files_to_modify:
+        return False
+
+    configuration_files_to_modify = list(project_files.keys()) if has_dependency_errors(diagnostics) else []
+    improvement_context["error_count"] = error_count
+    improvement_context["files_to_modify"] = [f for f in files_to_modify if f not in configuration_files_to_modify]
+    improvement_context["configuration_files_to_modify"] = configuration_files_to_modify
+    improvement_context["categorized_errors"] = categorize_diagnostics(diagnostics)
+    return True
+
+def analyze_test_results(improvement_context: Dict, use_cache: bool = True) -> Tuple[int, List[str], List[str], Dict[str, List[str]]]:
+    if analyze_test_results_locally(improvement_context):
+        return improvement_context
+
     language = improvement_context.get("language", "")
     libraries = improvement_context.get("libraries", [])
     all_files = improvement_context.get("all_files", [])
@@ -206,7 +352,8 @@ def analyze_test_results(improvement_context: Dict) -> Tuple[int, List[str], Lis
 
     system_message = "You are an expert test engineer. Analyze the test results, return the error count, and list the files that need to be modified, considering the specified programming language, libraries, project configuration files, and project structure."
 
-    analysis_prompt = f"""Here are the test results and a list of all files in the project. Analyze these results, considering the specified programming language, libraries, project configuration files, and project structure. Provide the following:
+    def render_analysis_prompt(project_files: str, test_results: str, all_files: str, project_structure: str, reflection_suggestions: str) -> str:
+        return f"""Here are the test results and a list of all files in the project. Analyze these results, considering the specified programming language, libraries, project configuration files, and project structure. Provide the following:
 1. The total number of errors found.
 2. A list of all files that need to be modified based on these results, ensuring that the files exist in the project structure.
 3. A separate list of project configuration files (e.g., Cargo.toml, package.json) that may need modification to fix dependencies or project settings.
@@ -219,7 +366,7 @@ Libraries:
 {', '.join(libraries)}
 
 Project Files:
-{json.dumps(project_files, indent=2)}
+{project_files}
 
 Test Results:
 {test_results}
@@ -228,7 +375,7 @@ All Files in Project:
 {all_files}
 
 Project Structure:
-{json.dumps(project_structure, indent=2)}
+{project_structure}
 
 Reflection Suggestions:
 {reflection_suggestions}
@@ -241,22 +388,32 @@ JSON Format Example:
     "configuration_files_to_modify": A JSON array of project configuration files that may need changes.
 }}
 """
-    analysis_response = get_completion(analysis_prompt, system_message=system_message)
-    analysis_response = clean_file_content(analysis_response)
-    
+
+    # 按重要性从低到高排列，超出上下文窗口时依次裁剪
+    analysis_prompt = fit_prompt(render_analysis_prompt, [
+        {"name": "project_structure", "value": project_structure, "kind": "structure"},
+        {"name": "all_files", "value": all_files, "kind": "list", "relevance": test_results},
+        {"name": "reflection_suggestions", "value": reflection_suggestions, "kind": "text"},
+        {"name": "project_files", "value": project_files, "kind": "files", "relevance": test_results},
+        {"name": "test_results", "value": test_results, "kind": "text"},
+    ], model=get_model(), label="analyze_test_results")
+    analysis_schema = object_schema({
+        "error_count": {"type": "integer"},
+        "files_to_modify": STRING_ARRAY_SCHEMA,
+        "configuration_files_to_modify": STRING_ARRAY_SCHEMA,
+    })
     try:
-        analysis_data = json.loads(analysis_response)
-        error_count = analysis_data.get("error_count", 0)
-        files_to_modify = analysis_data.get("files_to_modify", [])
-        configuration_files_to_modify = analysis_data.get("configuration_files_to_modify", [])
-        categorized_errors = categorize_errors(test_results)
-        improvement_context["error_count"] = error_count
-        improvement_context["files_to_modify"] = files_to_modify
-        improvement_context["configuration_files_to_modify"] = configuration_files_to_modify
-        improvement_context["categorized_errors"] = categorized_errors
-        return improvement_context
-    except json.JSONDecodeError as e:
-        return analyze_test_results(improvement_context)
+        analysis_data = get_structured_completion(analysis_prompt, analysis_schema, system_message=system_message, name="test_analysis", use_cache=use_cache)
+    except StructuredOutputError as e:
+        # 无法得到分析结果时视为仍有错误，交给下一轮重新测试
+        print(f"analyze_test_results - {e}")
+        analysis_data = {"error_count": 1, "files_to_modify": [], "configuration_files_to_modify": []}
+
+    improvement_context["error_count"] = analysis_data["error_count"]
+    improvement_context["files_to_modify"] = analysis_data["files_to_modify"]
+    improvement_context["configuration_files_to_modify"] = analysis_data["configuration_files_to_modify"]
+    improvement_context["categorized_errors"] = categorize_errors(test_results)
+    return improvement_context
 
 def detect_unnecessary_files(modified_files: Dict[str, str], project_structure: Dict[str, List[str]], project_configuration: Dict[str, str]) -> List[str]:
     system_message = "You are an expert software developer. Analyze the following project structure and modified files, and determine which files, if any, are unnecessary or misplaced based on the project structure and common development practices."
@@ -285,17 +442,102 @@ JSON Format Example:
 }}
 """
     # 调用 OpenAI 进行分析
-    response = get_completion(analysis_prompt, system_message=system_message)
-    response = clean_file_content(response)
-
-    # 解析返回的结果
+    schema = object_schema({"unnecessary_files": STRING_ARRAY_SCHEMA})
     try:
-        analysis_data = json.loads(response)
-        unnecessary_files = analysis_data.get("unnecessary_files", [])
+        analysis_data = get_structured_completion(analysis_prompt, schema, system_message=system_message, name="unnecessary_files")
+        unnecessary_files = analysis_data["unnecessary_files"]
         return unnecessary_files
-    except json.JSONDecodeError as e:
+    except StructuredOutputError as e:
         return []
 
+FULL_OUTPUT_INSTRUCTIONS = """Ensure all modifications respect the existing project structure. Additionally, check if any project configuration files (e.g., Cargo.toml, package.json) need changes to fix dependencies or project settings. Return the modified content of each file as a dictionary under the key 'files'. If any files need to be deleted, provide a list under the key 'files_to_delete'.
+
+Return the result in **strict JSON format** without any explanations.
+JSON Format Example:
+{
+    "files": {
+        "path/to/file1": "Modified content for file 1",
+        "path/to/file2": "Modified content for file 2"
+    },
+    "files_to_delete": A list of files to delete
+}"""
+
+DIFF_OUTPUT_INSTRUCTIONS = """Ensure all modifications respect the existing project structure. Additionally, check if any project configuration files (e.g., Cargo.toml, package.json) need changes to fix dependencies or project settings.
+
+Do not return whole files. For every file to modify, return only the changed parts as search/replace blocks. The SEARCH part must copy the existing lines exactly, including enough surrounding lines to be unique. To create a new file, return its full content in a gen-file block. To delete a file, return a delete tag. Do not add any explanations.
+
+Format Example:
+<edit path="path/to/file1">
+<<<<<<< SEARCH
+existing lines to replace
+=======
+new lines
+>>>>>>> REPLACE
+</edit>
+<gen-file path="path/to/new_file">
+full content of the new file
+</gen-file>
+<delete path="path/to/file_to_delete"/>"""
+
+def rewrite_failed_files(failed_files: Dict[str, str], test_results: str, project_structure: Dict[str, List[str]]) -> Dict[str, str]:
+    """
+    Ask for the complete new content of the files whose edits could not be applied, in one request.
+    """
+    system_message = "You are an expert software developer. Rewrite the following files to fix the issues in the test results."
+
+    rewrite_prompt = f"""The edits for the following files could not be applied. Based on the test results, return the complete modified content of each file.
+
+Files (path -> content with the failed edit appended):
+{json.dumps(failed_files, indent=2)}
+
+Test Results:
+{test_results}
+
+Project Structure:
+{json.dumps(project_structure, indent=2)}
+
+Return every file in the following format without any explanation:
+<gen-file path=文件路径>
+文件内容
+</gen-file>
+"""
+    response = get_completion(rewrite_prompt, system_message=system_message)
+    return parse_design(response)
+
+def apply_modification_edits(improvement_context: Dict, response: str, original_files: Dict[str, str]) -> Dict[str, Union[Dict[str, str], List[str]]]:
+    """
+    Apply the search/replace (or unified diff) edits of a diff-mode response locally. Only the files
+    whose edits fail to apply are requested again as full rewrites.
+    """
+    base_path = improvement_context.get("base_path", "")
+    test_results = improvement_context.get("test_results", "")
+    project_files = improvement_context.get("project_files", {})
+    project_structure = improvement_context.get("project_structure", {})
+    project_index = improvement_context.get("project_index")
+
+    edits, files_to_delete = parse_edits(response)
+    modified_files = parse_design(response)
+    failed_files = {}
+    for path, edit in edits.items():
+        original = original_files.get(path)
+        if original is None:
+            original = load_file_content(base_path, [path], project_index).get(path, "")
+        try:
+            modified_files[path] = apply_edit(original, edit)
+        except PatchError as e:
+            print(f"Could not apply edit to {path}: {e}")
+            failed_files[path] = f"{original}\n\n--- Failed edit ---\n{edit}"
+
+    if failed_files:
+        print(f"Falling back to full rewrite for {len(failed_files)} files...")
+        modified_files.update(rewrite_failed_files(failed_files, test_results, project_structure))
+
+    unnecessary_files = detect_unnecessary_files(modified_files, project_structure, project_files)
+    return {
+        "files": modified_files,
+        "files_to_delete": files_to_delete + unnecessary_files
+    }
+
 def get_modification_results(improvement_context) -> Dict[str, Union[Dict[str, str], List[str]]]:
     base_path = improvement_context.get("base_path", "")
     files_to_modify = improvement_context.get("files_to_modify", [])
@@ -312,46 +554,53 @@ def get_modification_results(improvement_context) -> Dict[str, Union[Dict[str, s
         "and check if any project configuration files (e.g., Cargo.toml, package.json) need modification to resolve dependencies or project settings."
     )
 
-    files_content = load_file_content(base_path, files_to_modify)
-    configuration_files_content = load_file_content(base_path, configuration_files_to_modify)
+    project_index = improvement_context.get("project_index")
+    edit_mode = improvement_context.get("edit_mode", "full")
+    files_content = load_file_content(base_path, files_to_modify, project_index)
+    configuration_files_content = load_file_content(base_path, configuration_files_to_modify, project_index)
+    output_instructions = DIFF_OUTPUT_INSTRUCTIONS if edit_mode == "diff" else FULL_OUTPUT_INSTRUCTIONS
 
-    modification_prompt = f"""Based on the following test results, categorized errors, and the project structure, maximize the modifications in the specified files to fix issues and improve code quality.
+    def render_modification_prompt(test_results: str, categorized_errors: str, files_content: str, configuration_files_content: str, project_files: str, project_structure: str, reflection_suggestions: str) -> str:
+        return f"""Based on the following test results, categorized errors, and the project structure, maximize the modifications in the specified files to fix issues and improve code quality.
 
 Test Results:
 {test_results}
 
 Categorized Errors:
-{json.dumps(categorized_errors, indent=2)}
+{categorized_errors}
 
 Files to Modify:
-{json.dumps(files_content, indent=2)}
+{files_content}
 
 Configuration Files to Modify:
-{json.dumps(configuration_files_content, indent=2)}
+{configuration_files_content}
 
 Project Files:
-{json.dumps(project_files, indent=2)}
+{project_files}
 
 Project Structure:
-{json.dumps(project_structure, indent=2)}
+{project_structure}
 
 Reflection Suggestions:
 {reflection_suggestions}
 
-Ensure all modifications respect the existing project structure. Additionally, check if any project configuration files (e.g., Cargo.toml, package.json) need changes to fix dependencies or project settings. Return the modified content of each file as a dictionary under the key 'files'. If any files need to be deleted, provide a list under the key 'files_to_delete'.
-
-Return the result in **strict JSON format** without any explanations.
-JSON Format Example:
-{{
-    "files": {{
-        "path/to/file1": "Modified content for file 1",
-        "path/to/file2": "Modified content for file 2"
-    }},
-    "files_to_delete": A list of files to delete
-}}
+{output_instructions}
 """
 
+    # 按重要性从低到高排列，超出上下文窗口时依次裁剪
+    modification_prompt = fit_prompt(render_modification_prompt, [
+        {"name": "project_structure", "value": project_structure, "kind": "structure"},
+        {"name": "reflection_suggestions", "value": reflection_suggestions, "kind": "text"},
+        {"name": "project_files", "value": project_files, "kind": "files", "relevance": test_results},
+        {"name": "categorized_errors", "value": categorized_errors, "kind": "json"},
+        {"name": "test_results", "value": test_results, "kind": "text"},
+        {"name": "configuration_files_content", "value": configuration_files_content, "kind": "files", "relevance": test_results},
+        {"name": "files_content", "value": files_content, "kind": "files", "relevance": test_results},
+    ], model=get_model(), label="get_modification_results")
     response = get_completion(modification_prompt, system_message=system_message)
+    if edit_mode == "diff":
+        return apply_modification_edits(improvement_context, response, {**configuration_files_content, **files_content})
+    raw_response = response
     response = clean_file_content(response)
 
     reflection_prompt = f"""Reflect on the following response. Ensure that the modifications fully address all issues, and further optimize the changes where necessary. Also, confirm if any project configuration files (e.g., Cargo.toml, package.json) need modifications.
@@ -386,7 +635,7 @@ JSON Format Example:
         modification_data = json.loads(response)
     except json.JSONDecodeError as e:
         modification_data = {
-            "files": parse_json_with_code(response),
+            "files": parse_json_with_code(raw_response),
             "files_to_delete": []
         }
 
@@ -401,42 +650,34 @@ JSON Format Example:
     }
 
 def parse_json_with_code(json_response: str) -> Dict[str, str]:
-    system_message_file_list = "Return only the list of file paths from the provided response."
-    file_list_prompt = f"""
-Given the following response, return only the file paths without any additional explanations:
-
-Response:
-{json_response}
-
-Return format example:
-["path/to/file1", "path/to/file2"]
-"""
-
-    file_list_response = get_completion(file_list_prompt, system_message=system_message_file_list)
-    
-    try:
-        file_list = json.loads(file_list_response)
-    except json.JSONDecodeError as e:
-        print(f"Failed to parse file list: {e}")
-        return {}
+    """
+    Recover the modified files from a response that is not valid JSON. The files are extracted locally
+    first; only when nothing can be recovered is the whole response reformatted in one batched call.
+    """
+    files_content = extract_files_from_response(json_response)
+    if files_content:
+        return files_content
 
-    files_content = {}
-    system_message_file_content = "Return only the content of the specified file."
-    
-    for file_path in file_list:
-        file_content_prompt = f"""
-Given the following response and the file path '{file_path}', return only the content of the specified file without any explanations.
+    system_message = "Reformat the provided response without changing any file content."
+    reformat_prompt = f"""
+Given the following response, return every file it contains wrapped in <gen-file> tags, without any additional explanations:
 
 Response:
 {json_response}
 
-Return the content for file: {file_path}
+Return format example:
+<gen-file path="path/to/file1">
+content of file 1
+</gen-file>
+<gen-file path="path/to/file2">
+content of file 2
+</gen-file>
 """
 
-        file_content_response = get_completion(file_content_prompt, system_message=system_message_file_content)
-        
-        files_content[file_path] = file_content_response
-
+    reformat_response = get_completion(reformat_prompt, system_message=system_message)
+    files_content = parse_design(reformat_response)
+    if not files_content:
+        print("Failed to recover any file from the modification response.")
     return files_content
 
 def get_modified_files(improvement_context: Dict) -> List[Dict[str, str]]:
@@ -494,13 +735,83 @@ def update_file(base_path: str, file_path: str, new_content: str) -> None:
         f.write(new_content)
     print(f"Writed file: {full_path}")
 
-def select_correct_test_command(base_path: str, test_execution_commands: List[str]) -> str:
-    correct_test_command = None
+def reflink_workspace(base_path: str, target_path: str) -> bool:
+    """
+    Clone base_path with copy-on-write reflinks (btrfs, xfs, APFS). Returns False when unsupported.
+    """
+    if sys.platform == "darwin":
+        command = ["cp", "-cR", base_path, target_path]
+    else:
+        command = ["cp", "-a", "--reflink=always", base_path, target_path]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return False
+    if result.returncode != 0:
+        shutil.rmtree(target_path, ignore_errors=True)
+        return False
+    return True
+
+def clone_workspace(base_path: str, target_path: str, skip_folders: List[str]) -> None:
+    """
+    Clone base_path into target_path, preferring copy-on-write reflinks and falling back to a plain copy.
+    Files are never hard-linked: candidate test commands may rewrite files in place (lock files,
+    snapshots, formatters) and must not change the original workspace. Without reflinks, build output
+    folders and TEST_RESULTS.txt are left out to keep the copy small.
+    """
+    if reflink_workspace(base_path, target_path):
+        return
+
+    def ignore(root: str, names: List[str]) -> List[str]:
+        relative_root = os.path.relpath(root, base_path)
+        ignored = []
+        for name in names:
+            relative_path = os.path.normpath(os.path.join(relative_root, name))
+            if name == "TEST_RESULTS.txt" or relative_path in skip_folders or name in skip_folders:
+                ignored.append(name)
+        return ignored
+
+    shutil.copytree(base_path, target_path, symlinks=True, ignore=ignore, copy_function=shutil.copy2)
+
+def run_candidate_test_command(test_command: str, workspace: str, timeout: float, deadline: float) -> str:
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        return "Test execution skipped: deadline exceeded."
+    return execute_tests(test_command, workspace, timeout=min(timeout, remaining))
+
+def run_candidate_test_commands(base_path: str, test_execution_commands: List[str], skip_folders: List[str], timeout: float = 300, deadline: float = 600) -> Dict[str, str]:
+    """
+    Run every candidate test command concurrently in a process pool, each in its own scratch clone
+    of the workspace, sharing one wall-clock deadline.
+    """
     test_results_by_command = {}
+    if not test_execution_commands:
+        return test_results_by_command
 
-    for test_command in test_execution_commands:
-        test_results = execute_tests(test_command, base_path)
-        test_results_by_command[test_command] = test_results
+    deadline_at = time.time() + deadline
+    scratch_root = tempfile.mkdtemp(prefix=".tdd_scratch_", dir=os.path.dirname(os.path.abspath(base_path)))
+    try:
+        futures = {}
+        max_workers = min(len(test_execution_commands), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for index, test_command in enumerate(test_execution_commands):
+                workspace = os.path.join(scratch_root, str(index))
+                clone_workspace(base_path, workspace, skip_folders)
+                future = executor.submit(run_candidate_test_command, test_command, workspace, timeout, deadline_at)
+                futures[future] = test_command
+        # 每个候选命令的超时都不会超过共享的截止时间，因此退出进程池时所有任务均已结束
+        for future, test_command in futures.items():
+            try:
+                test_results_by_command[test_command] = future.result()
+            except Exception as e:
+                test_results_by_command[test_command] = f"Test execution failed: {e}"
+    finally:
+        shutil.rmtree(scratch_root, ignore_errors=True)
+    return test_results_by_command
+
+def select_correct_test_command(base_path: str, test_execution_commands: List[str], skip_folders: Optional[List[str]] = None, timeout: float = 300, deadline: float = 600) -> str:
+    correct_test_command = None
+    test_results_by_command = run_candidate_test_commands(base_path, test_execution_commands, skip_folders or [], timeout, deadline)
     system_message = "You are an expert test engineer. Analyze the following test results for different commands and identify the most effective one."
 
     selection_prompt = f"""
@@ -521,12 +832,11 @@ Return the correct test command in JSON format without any explanation:
 }}
 """
 
-    selection_response = get_completion(selection_prompt, system_message=system_message)
-    selection_response = clean_file_content(selection_response)
+    schema = object_schema({"correct_command": {"type": "string"}})
     try:
-        selection_data = json.loads(selection_response)
-        correct_test_command = selection_data.get("correct_command")
-    except json.JSONDecodeError as e:
+        selection_data = get_structured_completion(selection_prompt, schema, system_message=system_message, name="test_command")
+        correct_test_command = selection_data["correct_command"]
+    except StructuredOutputError as e:
         print(f"L530: {e}")
         return
 
@@ -566,13 +876,23 @@ def track_iteration_progress(previous_errors: Dict[str, List[str]], current_erro
         return True
     return False
 
+# 测试输出（归一化后）连续不变的次数：达到 STALL_REFLECT_AFTER 时进入反思，达到 STALL_STOP_AFTER 时提前结束
+STALL_REFLECT_AFTER = 1
+STALL_STOP_AFTER = 3
+
+ANALYSIS_RESULT_KEYS = ["error_count", "files_to_modify", "configuration_files_to_modify", "categorized_errors"]
+ANALYSIS_CHECKPOINT_KEYS = ["test_results", *ANALYSIS_RESULT_KEYS, "reflection_suggestions"]
+
+@report_calls
 def developer_agent(
     requirement: str,
     language: str,
     libraries: List[str],
     base_path: str,
     comment_language: str,
-    readme_language: str
+    readme_language: str,
+    edit_mode: str = "full",
+    resume: bool = False
 ) -> None:
     print("Load technical design document...")
     try:
@@ -581,8 +901,17 @@ def developer_agent(
         print(e)
         return
 
-    master_context = {}    
-    skip_folders, file_extensions = get_skip_folders_and_file_extensions(language, libraries)
+    checkpoint = load_checkpoint(base_path) if resume else None
+    if checkpoint and checkpoint.get("phase") == "completed":
+        print("The checkpoint shows the refactoring was already completed.")
+        return
+
+    master_context = {}
+    if checkpoint:
+        print(f"Resuming from checkpoint: iteration {checkpoint['improve_loop_count']}, phase '{checkpoint['phase']}'.")
+        skip_folders, file_extensions = checkpoint["skip_folders"], checkpoint["file_extensions"]
+    else:
+        skip_folders, file_extensions = get_skip_folders_and_file_extensions(language, libraries)
     master_context["base_path"] = base_path
     master_context["language"] = language
     master_context["skip_folders"] = skip_folders
@@ -591,25 +920,64 @@ def developer_agent(
     master_context["readme"] = readme
     master_context["libraries"] = libraries
 
-    project_structure = get_project_structure(base_path, skip_folders, file_extensions)
+    project_index = ProjectIndex(base_path, skip_folders, file_extensions)
+    master_context["project_index"] = project_index
+    project_structure = project_index.project_structure()
     master_context["project_structure"] = project_structure
-    print("Read current code...")
-    project_files = read_project_files(master_context)
-
-    print("Try to figure out the test command...")
-    _, test_execution_commands = extract_test_info(master_context)
 
-    correct_test_command = select_correct_test_command(base_path, test_execution_commands)
-    if not correct_test_command:
-        return
+    if checkpoint:
+        project_files = reload_project_files(base_path, dict.fromkeys(checkpoint["project_files"], ""), project_index)
+        correct_test_command = checkpoint["correct_test_command"]
+        improve_loop_count = checkpoint["improve_loop_count"]
+        previous_errors = checkpoint["previous_errors"]
+        previous_context = checkpoint["previous_context"]
+        reflection_suggestions = checkpoint["reflection_suggestions"]
+        resumed_analysis = checkpoint.get("analysis") if checkpoint["phase"] == "analyzed" else None
+        test_fingerprint = checkpoint.get("test_fingerprint")
+        # 从停滞中恢复时重新计数，给修改后的代码新的机会
+        stall_count = 0 if checkpoint["phase"] == "stalled" else checkpoint.get("stall_count", 0)
+    else:
+        print("Read current code...")
+        project_files = read_project_files(master_context)
+
+        print("Try to figure out the test command...")
+        _, test_execution_commands = extract_test_info(master_context)
+
+        correct_test_command = select_correct_test_command(base_path, test_execution_commands, skip_folders)
+        if not correct_test_command:
+            return
+
+        improve_loop_count = 0
+        previous_errors = {"critical": [], "high": [], "medium": [], "low": []}
+        previous_context = ""
+        reflection_suggestions = ""
+        resumed_analysis = None
+        test_fingerprint = None
+        stall_count = 0
+    previous_analysis = None
+
+    def save_phase(phase: str, analysis: Optional[Dict] = None) -> None:
+        save_checkpoint(base_path, {
+            "phase": phase,
+            "skip_folders": skip_folders,
+            "file_extensions": file_extensions,
+            "correct_test_command": correct_test_command,
+            "project_files": list(project_files.keys()),
+            "improve_loop_count": improve_loop_count,
+            "previous_errors": previous_errors,
+            "previous_context": previous_context,
+            "reflection_suggestions": reflection_suggestions,
+            "test_fingerprint": test_fingerprint,
+            "stall_count": stall_count,
+            "analysis": analysis,
+        })
 
-    improve_loop_count = 0
-    previous_errors = {"critical": [], "high": [], "medium": [], "low": []}
-    previous_context = ""
-    reflection_suggestions = ""
+    if not checkpoint:
+        save_phase("setup")
 
-    while improve_loop_count < 20:
-        improve_loop_count += 1
+    while improve_loop_count < 20 or resumed_analysis is not None:
+        if resumed_analysis is None:
+            improve_loop_count += 1
         improvement_context = {
             "language": language,
             "libraries": libraries,
@@ -618,38 +986,72 @@ def developer_agent(
             "project_structure": project_structure,
             "correct_test_command": correct_test_command,
             "reflection_suggestions": reflection_suggestions,
+            "project_index": project_index,
+            "edit_mode": edit_mode,
         }
         print(f"The {improve_loop_count}th refactoring begins: ")
 
-        all_files, project_structure = get_all_files_in_base_path(base_path, skip_folders, file_extensions)
+        project_index.refresh()
+        all_files = project_index.all_files()
+        project_structure = project_index.project_structure()
 
         improvement_context["all_files"] = all_files
         improvement_context["project_structure"] = project_structure
 
-        print("Run the tests...")
-        test_results = execute_tests(correct_test_command, base_path)
-        improvement_context["test_results"] = test_results
-
-        print("Analyze Result of tests...")
-        improvement_context = analyze_test_results(improvement_context)
-        error_count = improvement_context["error_count"]
-        categorized_errors = improvement_context["categorized_errors"]
-
-        print(f"There is {error_count} errrors in the test results.")
-
-        if error_count == 0:
-            print("Refactoring completed successfully.")
-            break
-
-        if track_iteration_progress(previous_errors, categorized_errors):
-            print("refactoring progress bottleneck, entering reflection mode...")
-            reflection_suggestions = reflect_and_optimize(test_results, previous_context)
-            previous_context += f"\nReflection {improve_loop_count}: {reflection_suggestions}"
-            improvement_context["reflection_suggestions"] = reflection_suggestions
-            print("with reflaction suggestions re-analyze the test results...")
-            improvement_context = analyze_test_results(improvement_context)
+        if resumed_analysis is not None:
+            print("Reuse the test analysis from the checkpoint...")
+            improvement_context.update(resumed_analysis)
+            categorized_errors = improvement_context["categorized_errors"]
+            previous_analysis = {key: improvement_context.get(key) for key in ANALYSIS_RESULT_KEYS}
+            resumed_analysis = None
         else:
-            pass
+            print("Run the tests...")
+            test_results = execute_tests(correct_test_command, base_path, stop_patterns=get_stop_patterns(language))
+            improvement_context["test_results"] = test_results
+
+            current_fingerprint = fingerprint_test_output(test_results, base_path)
+            stall_count = stall_count + 1 if current_fingerprint == test_fingerprint else 0
+            test_fingerprint = current_fingerprint
+
+            if stall_count and previous_analysis is not None:
+                print("The test output is unchanged, reuse the previous analysis...")
+                improvement_context.update(previous_analysis)
+            else:
+                print("Analyze Result of tests...")
+                improvement_context = analyze_test_results(improvement_context)
+            error_count = improvement_context["error_count"]
+            categorized_errors = improvement_context["categorized_errors"]
+
+            print(f"There is {error_count} errrors in the test results.")
+
+            if error_count == 0:
+                print("Refactoring completed successfully.")
+                save_phase("completed")
+                break
+
+            if stall_count >= STALL_STOP_AFTER:
+                print(f"The test output has not changed for {stall_count + 1} iterations, stopping the refactoring early.")
+                save_phase("stalled")
+                break
+
+            if stall_count >= STALL_REFLECT_AFTER:
+                # 修改没有改变测试输出：分析不变，直接换一种修改策略
+                print(f"The test output has not changed for {stall_count + 1} iterations, entering reflection mode...")
+                reflection_suggestions = reflect_and_optimize(test_results, previous_context)
+                previous_context += f"\nReflection {improve_loop_count}: {reflection_suggestions}"
+                improvement_context["reflection_suggestions"] = reflection_suggestions
+            elif track_iteration_progress(previous_errors, categorized_errors):
+                print("refactoring progress bottleneck, entering reflection mode...")
+                reflection_suggestions = reflect_and_optimize(test_results, previous_context)
+                previous_context += f"\nReflection {improve_loop_count}: {reflection_suggestions}"
+                improvement_context["reflection_suggestions"] = reflection_suggestions
+                print("with reflaction suggestions re-analyze the test results...")
+                improvement_context = analyze_test_results(improvement_context)
+            else:
+                pass
+
+            previous_analysis = {key: improvement_context.get(key) for key in ANALYSIS_RESULT_KEYS}
+            save_phase("analyzed", {key: improvement_context.get(key) for key in ANALYSIS_CHECKPOINT_KEYS})
 
         print("With the test results, attempt to refactor the code...")
         modified_files = get_modified_files(improvement_context)
@@ -657,13 +1059,16 @@ def developer_agent(
         for modified_file in modified_files:
             file_path = modified_file.get("path", "")
             new_content = modified_file.get("content", "")
-            new_content = clean_code_with_openai(new_content)
+            if edit_mode != "diff":
+                new_content = clean_code_with_openai(new_content)
             if file_path and new_content:
                 update_file(base_path, file_path, new_content)
+                project_index.invalidate(file_path)
 
         print("reload project files...")
-        project_files = reload_project_files(base_path, project_files)
+        project_files = reload_project_files(base_path, project_files, project_index)
         
         previous_errors = categorized_errors
-
-    print("The number of reconfigurations reaches the maximum of 20 and stops the reconfiguration. Please perform the refactoring task again if necessary.")
\ No newline at end of file
+        save_phase("modified")
+    else:
+        print("The number of reconfigurations reaches the maximum of 20 and stops the reconfiguration. Please perform the refactoring task again if necessary.")
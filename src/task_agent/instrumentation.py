@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Callable, Any
+from .config import getenv
+
+# 补全层自身的函数，查找调用方时跳过
+COMPLETION_LAYER = {
+    "get_completion",
+    "stream_completion",
+    "get_completion_async",
+    "gather_completions_async",
+    "get_completions",
+    "get_json_completion",
+    "get_structured_completion",
+    "parallel_map",
+    "call_with_caller",
+    "<lambda>",
+    "<genexpr>",
+}
+# 到达线程池、事件循环的帧后无法再向上追溯调用方
+STOP_MODULES = ("threading", "concurrent.futures", "asyncio")
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_hooks: List[Callable[[Dict[str, Any]], None]] = []
+_hooks_lock = threading.Lock()
+_default_sink_checked = False
+_collectors: List[List[Dict[str, Any]]] = []
+_caller = contextvars.ContextVar("task_agent_caller", default=None)
+
+
+def add_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Register a function called with the record of every completion call.
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+class JsonlSink:
+    """
+    Hook that appends each call record as one JSON line.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+def _install_default_sink() -> None:
+    global _default_sink_checked
+    if _default_sink_checked:
+        return
+    _default_sink_checked = True
+    path = getenv("CALL_LOG", ".tdd_agents/calls.jsonl")
+    if path and path.lower() not in ("none", "false", "0"):
+        add_hook(JsonlSink(path))
+
+
+def find_caller() -> str:
+    """
+    Name of the function that asked for the completion, skipping the completion layer itself.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(STOP_MODULES):
+            break
+        name = frame.f_code.co_name
+        is_layer = name in COMPLETION_LAYER and (
+            os.path.dirname(os.path.abspath(frame.f_code.co_filename)) == PACKAGE_DIR or name in ("<lambda>", "<genexpr>")
+        )
+        if not is_layer and module not in (__name__, "contextlib"):
+            return name
+        frame = frame.f_back
+    return _caller.get() or "unknown"
+
+
+@contextmanager
+def caller_scope(caller: str):
+    """
+    Attribute the calls made in this scope (e.g. on worker threads) to caller.
+    """
+    token = _caller.set(caller)
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def emit(record: Dict[str, Any]) -> None:
+    _install_default_sink()
+    with _hooks_lock:
+        hooks = list(_hooks)
+        for collector in _collectors:
+            collector.append(record)
+    for hook in hooks:
+        try:
+            hook(record)
+        except Exception as e:
+            print(f"Instrumentation hook failed: {e}")
+
+
+@contextmanager
+def track_call(mode: str, model: Optional[str], cache_enabled: bool):
+    """
+    Time one completion call and emit its record. The body fills prompt_tokens, completion_tokens,
+    continuations, retries, cache ("hit", "miss" or "off") and calls mark_first_token.
+    """
+    record = {
+        "timestamp": time.time(),
+        "caller": find_caller(),
+        "model": model,
+        "mode": mode,
+        "cache": "miss" if cache_enabled else "off",
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "tokens_estimated": False,
+        "continuations": 0,
+        "retries": 0,
+        "ttft": None,
+        "wall_time": None,
+        "error": None,
+        "_started": time.perf_counter(),
+    }
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["wall_time"] = round(time.perf_counter() - record.pop("_started"), 4)
+        emit(record)
+
+
+def mark_first_token(record: Dict[str, Any]) -> None:
+    if record["ttft"] is None:
+        record["ttft"] = round(time.perf_counter() - record["_started"], 4)
+
+
+def add_usage(record: Dict[str, Any], usage: Any, prompt: str = "", completion: str = "") -> None:
+    """
+    Add the token usage reported by the API, or an estimate when the backend does not report it.
+    """
+    if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+        record["prompt_tokens"] += usage.prompt_tokens or 0
+        record["completion_tokens"] += usage.completion_tokens or 0
+        return
+    from .budget import count_tokens
+
+    record["prompt_tokens"] += count_tokens(prompt, record["model"])
+    record["completion_tokens"] += count_tokens(completion, record["model"])
+    record["tokens_estimated"] = True
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Aggregate call records per caller, most expensive (by wall time) first.
+    """
+    rows = {}
+    for record in records:
+        row = rows.setdefault(record["caller"], {
+            "caller": record["caller"], "calls": 0, "cached": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "wall_time": 0.0, "ttft": [], "continuations": 0, "retries": 0, "errors": 0,
+        })
+        row["calls"] += 1
+        row["cached"] += record["cache"] == "hit"
+        row["prompt_tokens"] += record["prompt_tokens"]
+        row["completion_tokens"] += record["completion_tokens"]
+        row["wall_time"] += record["wall_time"] or 0
+        if record["ttft"] is not None:
+            row["ttft"].append(record["ttft"])
+        row["continuations"] += record["continuations"]
+        row["retries"] += record["retries"]
+        row["errors"] += record["error"] is not None
+    for row in rows.values():
+        row["ttft"] = sum(row["ttft"]) / len(row["ttft"]) if row["ttft"] else None
+    return sorted(rows.values(), key=lambda row: row["wall_time"], reverse=True)
+
+
+def format_summary(records: List[Dict[str, Any]], title: str = "LLM calls") -> str:
+    rows = summarize(records)
+    header = f"{'caller':<36}{'calls':>6}{'cached':>7}{'prompt tok':>11}{'compl tok':>10}{'wall s':>9}{'ttft s':>8}{'cont':>5}{'retry':>6}{'err':>4}"
+    lines = [f"== {title} ==", header, "-" * len(header)]
+    for row in rows + [_total_row(rows)]:
+        ttft = f"{row['ttft']:.2f}" if row["ttft"] is not None else "-"
+        lines.append(
+            f"{row['caller'][:35]:<36}{row['calls']:>6}{row['cached']:>7}{row['prompt_tokens']:>11}{row['completion_tokens']:>10}"
+            f"{row['wall_time']:>9.1f}{ttft:>8}{row['continuations']:>5}{row['retries']:>6}{row['errors']:>4}"
+        )
+    return "\n".join(lines)
+
+
+def _total_row(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    total = {"caller": "TOTAL", "ttft": None}
+    for key in ("calls", "cached", "prompt_tokens", "completion_tokens", "wall_time", "continuations", "retries", "errors"):
+        total[key] = sum(row[key] for row in rows)
+    return total
+
+
+def report_calls(func: Callable) -> Callable:
+    """
+    Decorator for agent entry points: collect the calls made during the run and print a summary table at the end.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        records = []
+        with _hooks_lock:
+            _collectors.append(records)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with _hooks_lock:
+                _collectors.remove(records)
+            if records:
+                print(format_summary(records, title=f"{func.__name__} LLM calls"))
+
+    return wrapper
@@ -0,0 +1,90 @@
+import os
+import re
+from typing import List, Optional
+
+
+class LanguageAdapter:
+    """
+    Stable, per-language project conventions: folders to skip, file extensions to check,
+    project configuration files, test and build commands, and fail-fast output patterns.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        keywords: List[str],
+        skip_folders: List[str],
+        file_extensions: List[str],
+        config_files: List[str],
+        test_commands: List[str],
+        build_commands: Optional[List[str]] = None,
+        stop_patterns: Optional[List[str]] = None,
+    ):
+        self.name = name
+        self.keywords = keywords
+        self.skip_folders = skip_folders
+        self.file_extensions = file_extensions
+        self.config_files = config_files
+        self.test_commands = test_commands
+        self.build_commands = build_commands or []
+        self.stop_patterns = stop_patterns or []
+
+    def matches(self, language: str) -> bool:
+        words = set(re.split(r"[^a-z0-9+#]+", language.lower()))
+        return any(keyword in words for keyword in self.keywords)
+
+    def find_config_file(self, files: List[str]) -> Optional[str]:
+        """
+        Return the project configuration file closest to the project root, in config_files order.
+        """
+        candidates = [file for file in files if os.path.basename(file) in self.config_files]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda file: (file.count(os.sep), self.config_files.index(os.path.basename(file))))
+
+
+LANGUAGE_ADAPTERS: List[LanguageAdapter] = [
+    LanguageAdapter(
+        name="rust",
+        keywords=["rust", "cargo"],
+        skip_folders=["target", ".git"],
+        file_extensions=[".rs", ".toml"],
+        config_files=["Cargo.toml"],
+        test_commands=["cargo test"],
+        build_commands=["cargo build"],
+        stop_patterns=[r"^error\[E\d+\]", r"^error: could not compile"],
+    ),
+    LanguageAdapter(
+        name="python",
+        keywords=["python", "python3", "py"],
+        skip_folders=["__pycache__", ".venv", "venv", ".pytest_cache", ".mypy_cache", ".tox", ".git", "build", "dist", "*.egg-info"],
+        file_extensions=[".py", ".toml", ".cfg", ".ini", "requirements.txt"],
+        config_files=["pyproject.toml", "setup.py", "setup.cfg", "requirements.txt"],
+        test_commands=["python -m pytest"],
+        build_commands=["python -m compileall -q ."],
+    ),
+    LanguageAdapter(
+        name="node",
+        keywords=["typescript", "javascript", "node", "nodejs", "ts", "js"],
+        skip_folders=["node_modules", "dist", "build", "coverage", ".next", ".git"],
+        file_extensions=[".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", "package.json", "tsconfig.json"],
+        config_files=["package.json", "tsconfig.json"],
+        test_commands=["npm test", "npx jest"],
+        build_commands=["npx tsc --noEmit"],
+        stop_patterns=[r"error TS\d+:"],
+    ),
+]
+
+
+def register_language_adapter(adapter: LanguageAdapter) -> None:
+    """
+    Register an adapter for another stack. Adapters registered later take precedence.
+    """
+    LANGUAGE_ADAPTERS.insert(0, adapter)
+
+
+def get_language_adapter(language: str) -> Optional[LanguageAdapter]:
+    for adapter in LANGUAGE_ADAPTERS:
+        if adapter.matches(language):
+            return adapter
+    return None
@@ -0,0 +1,221 @@
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Optional, Any
+from .transcript import prompt_hash
+
+# 本地模拟的 OpenAI 兼容服务端，只依赖标准库，用于离线基准测试与回放
+
+
+def estimate_tokens(text: str) -> int:
+    # 约 4 个字符一个 token，足以比较不同版本之间的差异
+    return max(1, len(text) // 4) if text else 0
+
+
+class ScriptedReply:
+    def __init__(self, content: str, finish_reason: str = "stop", latency: Optional[float] = None):
+        self.content = content
+        self.finish_reason = finish_reason
+        self.latency = latency
+
+
+class ResponseScript:
+    """
+    Scripted responses: each rule has a regex `match` searched in the system and user messages, and
+    either `content`, `contents` (returned in turn, the last one repeating) or `echo` (a regex whose
+    first group is copied from the prompt). `finish_reasons` optionally gives the finish reason of each
+    of the `contents`, e.g. "length" to simulate a truncated response. The first matching rule wins;
+    `default` answers the rest.
+    Recorded responses, keyed by prompt_hash, take precedence over the rules.
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, default: Optional[str] = None, recorded: Optional[Dict[str, str]] = None):
+        self.rules = []
+        for rule in rules or []:
+            self.rules.append(dict(rule, pattern=re.compile(rule["match"], re.DOTALL), hits=0))
+        self.default = default
+        self.recorded = recorded or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_fixture(cls, fixture: Dict[str, Any]) -> "ResponseScript":
+        return cls(fixture.get("responses", []), fixture.get("server", {}).get("default"))
+
+    def load_recorded(self, path: str) -> None:
+        """
+        Load recorded responses from a JSONL file with one {"messages": [...], "response": "..."} object per line.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.recorded[prompt_hash(entry["messages"]) if "messages" in entry else entry["prompt_hash"]] = entry["response"]
+
+    def reply(self, messages: List[Dict[str, Any]]) -> Optional[ScriptedReply]:
+        recorded = self.recorded.get(prompt_hash(messages))
+        if recorded is not None:
+            return ScriptedReply(recorded)
+
+        prompt = "\n".join(str(message.get("content") or "") for message in messages if message.get("role") in ("system", "user"))
+        with self._lock:
+            for rule in self.rules:
+                if not rule["pattern"].search(prompt):
+                    continue
+                rule["hits"] += 1
+                finish_reason = rule.get("finish_reason", "stop")
+                if "echo" in rule:
+                    echoed = re.search(rule["echo"], prompt, re.DOTALL)
+                    content = echoed.group(1) if echoed else ""
+                elif "contents" in rule:
+                    index = min(rule["hits"], len(rule["contents"])) - 1
+                    content = rule["contents"][index]
+                    if "finish_reasons" in rule:
+                        finish_reason = rule["finish_reasons"][index]
+                else:
+                    content = rule.get("content", "")
+                return ScriptedReply(content, finish_reason, rule.get("latency"))
+        if self.default is not None:
+            return ScriptedReply(self.default)
+        return None
+
+    def unused_rules(self) -> List[str]:
+        return [rule.get("name", rule["match"]) for rule in self.rules if rule["hits"] == 0]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头部与正文分开写出，关闭 Nagle 算法以免每个请求多出一次延迟确认的等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+            return
+
+        server = self.server
+        messages = body.get("messages", [])
+        reply = server.script.reply(messages)
+        server.record_request(body, reply)
+        if reply is None:
+            # 没有匹配的脚本时明确报错，避免基准测试悄悄偏离真实流程
+            self.send_json(501, {"error": {"message": "No scripted response matches this prompt.", "type": "mock_server_error"}})
+            return
+
+        latency = reply.latency if reply.latency is not None else server.latency
+        prompt_tokens = sum(estimate_tokens(str(message.get("content") or "")) for message in messages)
+        completion_tokens = estimate_tokens(reply.content)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-mock-{server.request_count}"
+        model = body.get("model") or "mock"
+        time.sleep(latency)
+
+        if not body.get("stream"):
+            server.generation_delay(completion_tokens)
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply.content}, "finish_reason": reply.finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage_: Optional[Dict] = None) -> Dict[str, Any]:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+            }
+            if usage_ is not None:
+                data["usage"] = usage_
+            return data
+
+        events = [chunk({"role": "assistant", "content": ""})]
+        pieces = re.findall(r"\S*\s*", reply.content)
+        events.extend(chunk({"content": piece}) for piece in pieces if piece)
+        events.append(chunk({}, reply.finish_reason))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append(chunk(None, usage_=usage))
+        for event in events:
+            server.generation_delay(estimate_tokens(event["choices"][0]["delta"].get("content", "")) if event["choices"] else 0)
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def send_json(self, status: int, data: Dict[str, Any]) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    OpenAI-compatible /v1/chat/completions endpoint answering from a ResponseScript, with a configurable
+    delay before the first token (latency) and generation speed (tokens_per_second, unlimited if None).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, script: ResponseScript, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, tokens_per_second: Optional[float] = None):
+        super().__init__((host, port), MockLLMHandler)
+        self.script = script
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.request_count = 0
+        self.unmatched_prompts = []
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def generation_delay(self, tokens: int) -> None:
+        if self.tokens_per_second and tokens:
+            time.sleep(tokens / self.tokens_per_second)
+
+    def record_request(self, body: Dict[str, Any], reply: Optional[ScriptedReply]) -> None:
+        with self._count_lock:
+            self.request_count += 1
+            if reply is None:
+                messages = body.get("messages", [])
+                self.unmatched_prompts.append(str(messages[-1].get("content", ""))[:200] if messages else "")
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
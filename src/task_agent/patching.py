@@ -0,0 +1,156 @@
+import re
+import difflib
+from typing import List, Dict, Tuple, Optional
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+EDIT_PATTERN = r"<edit path=['\"]?([^>]+?)['\"]?>\n?(.*?)</edit>"
+DELETE_PATTERN = r"<delete path=['\"]?([^>]+?)['\"]?\s*/?>"
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# 模糊匹配时允许的最低相似度
+FUZZY_THRESHOLD = 0.85
+
+
+class PatchError(ValueError):
+    pass
+
+
+def parse_search_replace_blocks(edit: str) -> List[Tuple[str, str]]:
+    blocks = []
+    lines = edit.splitlines(keepends=True)
+    index = 0
+    while index < len(lines):
+        if lines[index].strip() != SEARCH_MARKER:
+            index += 1
+            continue
+        search, replace = [], []
+        index += 1
+        while index < len(lines) and lines[index].strip() != DIVIDER_MARKER:
+            search.append(lines[index])
+            index += 1
+        index += 1
+        while index < len(lines) and lines[index].strip() != REPLACE_MARKER:
+            replace.append(lines[index])
+            index += 1
+        if index >= len(lines):
+            raise PatchError("unterminated search/replace block")
+        index += 1
+        blocks.append(("".join(search), "".join(replace)))
+    return blocks
+
+
+def parse_unified_diff(edit: str) -> List[Tuple[int, List[str], List[str]]]:
+    """
+    Parse the hunks of a unified diff into (old start line, old lines, new lines).
+    """
+    hunks = []
+    current = None
+    for line in edit.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("---", "+++")) and not current[1] and not current[2]:
+            continue
+        if line.startswith("\\"):
+            continue
+        if line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        else:
+            content = line[1:] if line.startswith(" ") else line
+            current[1].append(content)
+            current[2].append(content)
+    return hunks
+
+
+def find_lines(lines: List[str], target: List[str], hint: int = 0) -> Optional[int]:
+    """
+    Locate target inside lines: exact match first (closest to the hint), then ignoring surrounding
+    whitespace, then the most similar window above FUZZY_THRESHOLD.
+    """
+    if not target:
+        return min(max(hint, 0), len(lines))
+    size = len(target)
+    candidates = range(len(lines) - size + 1)
+
+    def closest(matches: List[int]) -> Optional[int]:
+        return min(matches, key=lambda start: abs(start - hint)) if matches else None
+
+    exact = [start for start in candidates if lines[start:start + size] == target]
+    if exact:
+        return closest(exact)
+
+    stripped_target = [line.strip() for line in target]
+    loose = [start for start in candidates if [line.strip() for line in lines[start:start + size]] == stripped_target]
+    if loose:
+        return closest(loose)
+
+    best_start, best_ratio = None, FUZZY_THRESHOLD
+    joined_target = "\n".join(stripped_target)
+    for start in candidates:
+        window = "\n".join(line.strip() for line in lines[start:start + size])
+        ratio = difflib.SequenceMatcher(None, window, joined_target).ratio()
+        if ratio > best_ratio or (ratio == best_ratio and best_start is not None and abs(start - hint) < abs(best_start - hint)):
+            best_start, best_ratio = start, ratio
+    return best_start
+
+
+def apply_search_replace(original: str, blocks: List[Tuple[str, str]]) -> str:
+    lines = original.splitlines()
+    for search, replace in blocks:
+        search_lines = search.splitlines()
+        replace_lines = replace.splitlines()
+        if not search_lines:
+            # 空的 SEARCH 表示追加到文件末尾
+            lines.extend(replace_lines)
+            continue
+        start = find_lines(lines, search_lines)
+        if start is None:
+            raise PatchError(f"search block not found: {search_lines[0].strip()[:80]}")
+        lines[start:start + len(search_lines)] = replace_lines
+    return "\n".join(lines) + ("\n" if original.endswith("\n") or not original else "")
+
+
+def apply_unified_diff(original: str, edit: str) -> str:
+    lines = original.splitlines()
+    hunks = parse_unified_diff(edit)
+    if not hunks:
+        raise PatchError("no hunks found in diff")
+    offset = 0
+    for old_start, old_lines, new_lines in hunks:
+        start = find_lines(lines, old_lines, hint=old_start - 1 + offset)
+        if start is None:
+            raise PatchError(f"hunk @@ -{old_start} @@ does not apply")
+        lines[start:start + len(old_lines)] = new_lines
+        offset += len(new_lines) - len(old_lines)
+    return "\n".join(lines) + ("\n" if original.endswith("\n") or not original else "")
+
+
+def apply_edit(original: str, edit: str) -> str:
+    """
+    Apply search/replace blocks or a unified diff to the original content.
+    Raises PatchError when the edit cannot be located in the original.
+    """
+    if SEARCH_MARKER in edit:
+        return apply_search_replace(original, parse_search_replace_blocks(edit))
+    if any(HUNK_HEADER.match(line) for line in edit.splitlines()):
+        return apply_unified_diff(original, edit)
+    raise PatchError("edit is neither search/replace blocks nor a unified diff")
+
+
+def parse_edits(response: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Extract <edit path=...> blocks and <delete path=.../> tags from a model response.
+    """
+    edits = {}
+    for path, edit in re.findall(EDIT_PATTERN, response, re.DOTALL):
+        path = path.strip()
+        edits[path] = edits.get(path, "") + edit
+    files_to_delete = [path.strip() for path in re.findall(DELETE_PATTERN, response)]
+    return edits, files_to_delete
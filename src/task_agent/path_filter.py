@@ -0,0 +1,174 @@
+import os
+import re
+from typing import List, Dict, Optional
+
+
+class PathMatcher:
+    """
+    Compiled matcher for folders to skip, built once from skip folders and .gitignore patterns.
+
+    - Bare names (e.g. "target", "node_modules") go into a set and match a folder of that exact
+      name at any depth, so "target" no longer hides "targets/".
+    - Paths containing a slash (e.g. "build/output", "/dist") are anchored to the project root
+      and stored in a trie keyed by path segments.
+    - Patterns with glob characters are compiled to regular expressions, matched against the
+      folder name (bare patterns) or its relative path (anchored patterns).
+    """
+
+    GLOB_CHARS = set("*?[")
+
+    def __init__(self, patterns: List[str]):
+        self.names = set()
+        self.trie = {}
+        self.name_globs = []
+        self.path_globs = []
+        self.negations = []
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str) -> None:
+        pattern = pattern.strip()
+        if not pattern or pattern.startswith("#"):
+            return
+        negated = pattern.startswith("!")
+        if negated:
+            pattern = pattern[1:]
+        pattern = pattern.replace("\\", "/").rstrip("/")
+        if pattern.startswith("./"):
+            pattern = pattern[2:]
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        if pattern.startswith("**/"):
+            pattern = pattern[3:]
+            anchored = "/" in pattern
+        if not pattern:
+            return
+
+        if negated:
+            self.negations.append(self._compile(pattern))
+        elif self.GLOB_CHARS.intersection(pattern):
+            (self.path_globs if anchored else self.name_globs).append(self._compile(pattern))
+        elif anchored:
+            node = self.trie
+            for segment in pattern.split("/"):
+                node = node.setdefault(segment, {})
+            node[None] = True
+        else:
+            self.names.add(pattern)
+
+    @staticmethod
+    def _compile(pattern: str):
+        # "**" 可跨越多级目录，"*" 和 "?" 只匹配单个路径片段内的字符
+        regex = ""
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            if pattern.startswith("/**/", index):
+                regex += "(?:/.*)?/"
+                index += 4
+                continue
+            if pattern.startswith("**", index):
+                regex += ".*"
+                index += 2
+                continue
+            if char == "*":
+                regex += "[^/]*"
+            elif char == "?":
+                regex += "[^/]"
+            elif char == "[":
+                end = pattern.find("]", index + 1)
+                if end == -1:
+                    regex += re.escape(char)
+                else:
+                    regex += "[" + pattern[index + 1:end].replace("!", "^", 1) + "]"
+                    index = end
+            else:
+                regex += re.escape(char)
+            index += 1
+        return re.compile(regex + r"\Z")
+
+    def matches(self, relative_path: str) -> bool:
+        """
+        Return True if the folder at relative_path (relative to the project root, "/"-separated) is skipped.
+        """
+        relative_path = relative_path.replace(os.sep, "/")
+        name = relative_path.rsplit("/", 1)[-1]
+        if any(regex.match(relative_path) or regex.match(name) for regex in self.negations):
+            return False
+        if name in self.names:
+            return True
+        node = self.trie
+        for segment in relative_path.split("/"):
+            node = node.get(segment)
+            if node is None:
+                break
+        else:
+            if node.get(None):
+                return True
+        if any(regex.match(name) for regex in self.name_globs):
+            return True
+        return any(regex.match(relative_path) for regex in self.path_globs)
+
+
+def read_gitignore(base_path: str) -> List[str]:
+    gitignore_path = os.path.join(base_path, ".gitignore")
+    if not os.path.exists(gitignore_path):
+        return []
+    with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f:
+        return [line.rstrip("\n") for line in f]
+
+
+def compile_skip_folders(base_path: str, skip_folders: List[str], use_gitignore: bool = True) -> PathMatcher:
+    patterns = list(skip_folders)
+    if use_gitignore:
+        patterns.extend(read_gitignore(base_path))
+    return PathMatcher(patterns)
+
+
+def compile_file_extensions(file_extensions: List[str]):
+    """
+    Build a predicate that checks a file name against a set of suffixes.
+    Extensions without a leading dot (e.g. "rs") are treated as ".rs"; exact file names
+    (e.g. "Cargo.toml", "Makefile") also match.
+    """
+    suffixes = set()
+    for ext in file_extensions:
+        ext = ext.strip()
+        if not ext:
+            continue
+        suffixes.add(ext)
+        if not ext.startswith(".") and "." not in ext:
+            suffixes.add("." + ext)
+
+    def matches(file_name: str) -> bool:
+        if file_name in suffixes:
+            return True
+        index = file_name.find(".")
+        while index != -1:
+            if file_name[index:] in suffixes:
+                return True
+            index = file_name.find(".", index + 1)
+        return False
+
+    return matches
+
+
+def walk_project(base_path: str, matcher: PathMatcher):
+    """
+    os.walk over base_path that prunes skipped folders before descending into them.
+    Yields (root, relative_root, dirs, files) like os.walk with the relative root added.
+    """
+    for root, dirs, files in os.walk(base_path):
+        relative_root = os.path.relpath(root, base_path)
+        prefix = "" if relative_root == "." else relative_root.replace(os.sep, "/") + "/"
+        dirs[:] = [d for d in dirs if not matcher.matches(prefix + d)]
+        yield root, relative_root, dirs, files
+
+
+def build_project_structure(base_path: str, skip_folders: List[str], file_extensions: List[str], matcher: Optional[PathMatcher] = None) -> Dict[str, List[str]]:
+    matcher = matcher or compile_skip_folders(base_path, skip_folders)
+    extension_matches = compile_file_extensions(file_extensions)
+    project_structure = {}
+    for _, relative_root, _, files in walk_project(base_path, matcher):
+        project_structure[relative_root] = [file for file in files if extension_matches(file)]
+    return project_structure
@@ -0,0 +1,119 @@
+import os
+import hashlib
+from typing import List, Dict, Optional
+from .path_filter import compile_skip_folders, compile_file_extensions, walk_project
+
+
+class ProjectIndex:
+    """
+    Incremental index of the files under base_path.
+
+    For every file outside the skip folders the index keeps its size, mtime and (once read) content
+    and content hash. refresh() re-stats the tree and only drops cached content for files whose size
+    or mtime changed, so repeated structure queries and file reads do not touch the disk again.
+    """
+
+    def __init__(self, base_path: str, skip_folders: List[str], file_extensions: List[str]):
+        self.base_path = base_path
+        self.skip_folders = skip_folders
+        self.file_extensions = file_extensions
+        self.extension_matches = compile_file_extensions(file_extensions)
+        self.entries = {}
+        self.folders = []
+        self.refresh()
+
+    def refresh(self) -> List[str]:
+        """
+        Re-stat the tree and return the relative paths that were added, changed or removed.
+        """
+        entries = {}
+        folders = []
+        changed = []
+        # 每次刷新都重新编译，使 .gitignore 的修改立即生效
+        matcher = compile_skip_folders(self.base_path, self.skip_folders)
+        for root, relative_root, _, files in walk_project(self.base_path, matcher):
+            folders.append(relative_root)
+            for file in files:
+                path = os.path.normpath(os.path.join(relative_root, file))
+                try:
+                    stat = os.stat(os.path.join(root, file))
+                except OSError:
+                    continue
+                previous = self.entries.get(path)
+                if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime_ns:
+                    entries[path] = previous
+                    continue
+                entries[path] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": None, "content": None}
+                changed.append(path)
+        changed.extend(path for path in self.entries if path not in entries)
+        self.entries = entries
+        self.folders = folders
+        return changed
+
+    def relative_path(self, path: str) -> str:
+        """
+        Normalise a path that may repeat the base path (e.g. my_project/src/main.rs) to a relative one.
+        """
+        path = os.path.normpath(path)
+        base_path = os.path.normpath(self.base_path)
+        if path.startswith(base_path + os.sep):
+            path = path[len(base_path) + 1:]
+        return path
+
+    def invalidate(self, path: str) -> None:
+        self.entries.pop(self.relative_path(path), None)
+
+    def files(self) -> List[str]:
+        return list(self.entries.keys())
+
+    def project_structure(self) -> Dict[str, List[str]]:
+        project_structure = {folder: [] for folder in self.folders}
+        for path in self.entries:
+            folder, file = os.path.split(path)
+            folder = folder or "."
+            if folder in project_structure and self.extension_matches(file):
+                project_structure[folder].append(file)
+        return project_structure
+
+    def all_files(self) -> List[str]:
+        all_files = []
+        for folder, files in self.project_structure().items():
+            for file in files:
+                all_files.append(os.path.join(self.base_path, folder, file).replace("/./", "/"))
+        return all_files
+
+    def read(self, path: str) -> Optional[str]:
+        """
+        Return the content of the file, re-reading it only if it changed since it was cached.
+        """
+        path = self.relative_path(path)
+        full_path = os.path.join(self.base_path, path)
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            self.entries.pop(path, None)
+            return None
+        if not os.path.isfile(full_path):
+            return None
+        entry = self.entries.get(path)
+        if entry is None:
+            # 不在索引内（例如位于跳过的目录中）的文件直接读取，不加入缓存
+            with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
+                return f.read()
+        if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": None, "content": None}
+            self.entries[path] = entry
+        if entry["content"] is None:
+            with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
+                entry["content"] = f.read()
+            entry["hash"] = hashlib.sha256(entry["content"].encode("utf-8")).hexdigest()
+        return entry["content"]
+
+    def content_hash(self, path: str) -> Optional[str]:
+        content = self.read(path)
+        if content is None:
+            return None
+        entry = self.entries.get(self.relative_path(path))
+        if entry and entry["hash"]:
+            return entry["hash"]
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
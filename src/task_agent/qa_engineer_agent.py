@@ -1,7 +1,8 @@
 import os
 from typing import List, Dict, Tuple
-import yaml, json
+import json
 from .agent import get_completion, clean_file_content, get_skip_folders_and_file_extensions, get_project_structure
+from .instrumentation import report_calls
 
 def read_project_documents(base_path: str) -> Tuple[str, str]:
     readme_path = os.path.join(base_path, "README.md")
@@ -172,6 +173,8 @@ Return the result in Yaml format without any extra explanation. The format shoul
     corrected_extraction_results = get_completion(reflection_prompt, system_message=system_message)
     corrected_extraction_results = clean_file_content(corrected_extraction_results)
 
+    import yaml
+
     try:
         return yaml.safe_load(corrected_extraction_results)
     except yaml.YAMLError as e:
@@ -194,6 +197,7 @@ def update_test_files(base_path: str, test_files: List[Dict[str, str]]) -> None:
         except ValueError as e:
             print(f"Error updating file: {e}")
 
+@report_calls
 def qa_engineer_agent(
     requirement: str,
     language: str,
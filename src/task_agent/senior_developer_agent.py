@@ -1,11 +1,25 @@
 import os
-from typing import List, Dict
+from typing import List, Dict, Tuple, Optional
 import re, json
 from .agent import get_completion, clean_file_content, parse_design, filter_out_test_files, clean_base_path, get_project_structure, generate_project_settings
-
-def initial_tech_design(requirement: str, language: str, libraries: List[str], comment_language: str) -> str:
+from .agent import stream_completion, GenFileStreamParser, parallel_map, parse_json_response, FILE_PATH_PATTERN
+from .instrumentation import report_calls
+
+# 多个初始设计时，除第一个外依次加入以下方向提示，使候选方案彼此不同
+DESIGN_VARIANTS = [
+    "Prefer the smallest number of files and modules that still keeps a clear separation of concerns.",
+    "Prefer a layered architecture with explicit interfaces between the layers.",
+    "Prefer small, single-purpose modules that can be reused and replaced independently.",
+    "Prefer the conventional project layout and idioms of the programming language and its libraries.",
+]
+# 候选设计使用的采样温度
+VARIANT_TEMPERATURE = 0.7
+
+def initial_tech_design(requirement: str, language: str, libraries: List[str], comment_language: str, variant: str = "", temperature: float = 0.3) -> str:
     system_message = "You are a tech lead. Your task is to design a highly modular technical solution for a given feature requirement. Ensure that the solution has a clear separation of concerns, where the main function only coordinates different modules and does not contain all the business logic itself."
 
+    direction = f"\nDesign Direction:\n{variant}\n" if variant else ""
+
     design_prompt = f"""Given the feature requirement, specified programming language, and required libraries or middleware, design a highly modular technical solution. Include the module design and file structure, and provide recommendations on where the test files should be located.
 
 Ensure the following:
@@ -32,10 +46,10 @@ Libraries/Middleware:
 
 Comment Language:
 {comment_language}
-
+{direction}
 Technical Design:"""
 
-    design = get_completion(design_prompt, system_message=system_message)
+    design = get_completion(design_prompt, system_message=system_message, temperature=temperature)
     filtered_design = filter_out_test_files(design)
     return filtered_design.strip()
 
@@ -132,6 +146,47 @@ def parse_score(rating: str) -> float:
     overall_score = overall_score * structure_score_weight + (overall_score * (1 - structure_score_weight))
     return overall_score
 
+def search_tech_designs(requirement: str, language: str, libraries: List[str], comment_language: str, candidates: int = 1, top_k: int = 1) -> List[Tuple[str, float]]:
+    """
+    Beam search over technical designs: generate `candidates` initial designs concurrently, reflect on and
+    rate all of them in parallel, then improve and re-rate the `top_k` best concurrently.
+    Returns every (design, score) pair, initial and improved.
+    """
+    # 方向提示用完后再生成的候选与已有候选相同（会命中缓存），因此不超过提示数
+    max_candidates = len(DESIGN_VARIANTS) + 1
+    if candidates > max_candidates:
+        print(f"Warning: design_candidates = {candidates} is more than the {max_candidates} design directions available, using {max_candidates}.")
+    candidates = min(max(candidates, 1), max_candidates)
+    top_k = min(max(top_k, 1), candidates)
+
+    def generate(index: int) -> str:
+        if index == 0:
+            return initial_tech_design(requirement, language, libraries, comment_language)
+        variant = DESIGN_VARIANTS[(index - 1) % len(DESIGN_VARIANTS)]
+        return initial_tech_design(requirement, language, libraries, comment_language, variant=variant, temperature=VARIANT_TEMPERATURE)
+
+    print(f"Initial Design{f' ({candidates} candidates)' if candidates > 1 else ''}...")
+    designs = parallel_map(generate, range(candidates))
+
+    print("Reviewing and reflecting on the design...")
+    # 所有候选的反思与评分同时进行
+    reviews = parallel_map(lambda task: task[0](requirement, language, libraries, task[1]), [(review, design) for design in designs for review in (reflect_on_tech_design, rate_on_tech_design)])
+    suggestions = reviews[0::2]
+    scores = [parse_score(rated_score) for rated_score in reviews[1::2]]
+    design_list = list(zip(designs, scores))
+
+    best = sorted(range(candidates), key=lambda index: scores[index], reverse=True)[:top_k]
+    if candidates > 1:
+        print(f"Design scores: {', '.join(str(score) for score in scores)}")
+
+    def improve(index: int) -> Tuple[str, float]:
+        design = improve_tech_design(requirement, language, libraries, designs[index], suggestions[index])
+        return design, parse_score(rate_on_tech_design(requirement, language, libraries, design))
+
+    print(f"Improving the design{f' (top {top_k})' if top_k > 1 else ''}...")
+    design_list.extend(parallel_map(improve, best))
+    return design_list
+
 def verify_and_improve_design(requirement: str, language: str, libraries: List[str], design: str) -> str:
     system_message = "You are a senior tech lead. Your task is to verify the completeness of a technical design, identify any missing components, reference issues, or other problems, and suggest improvements."
 
@@ -232,7 +287,7 @@ File Paths:"""
     file_paths = get_completion(extraction_prompt, system_message=system_message)
     return file_paths.strip()
 
-def generate_codes_from_basepath(json_design: str, base_path: str) -> str:
+def code_generation_prompt(json_design: str, base_path: str) -> Tuple[str, str]:
     system_message = "You are an expert software developer. Based on the following JSON design document, generate the content for all files according to the specified file structure, ensuring that the project root directory is not repeated in the paths."
 
     generation_prompt = f"""Based on the following JSON design document, generate the content for all files. Ensure that the content adheres to the design specifications and that file paths do not incorrectly repeat the project root directory.
@@ -251,9 +306,115 @@ Base Path:
 
 Generated Files:"""
 
+    return system_message, generation_prompt
+
+def generate_codes_from_basepath(json_design: str, base_path: str) -> str:
+    system_message, generation_prompt = code_generation_prompt(json_design, base_path)
     generated_files = get_completion(generation_prompt, system_message=system_message)
     return generated_files.strip()
 
+def stream_codes_from_basepath(json_design: str, base_path: str) -> List[str]:
+    """
+    Stream the code generation and write every <gen-file> block to disk as soon as it is closed.
+    Files finished before a dropped connection are kept.
+    """
+    system_message, generation_prompt = code_generation_prompt(json_design, base_path)
+    parser = GenFileStreamParser()
+    written_files = []
+    try:
+        for delta in stream_completion(generation_prompt, system_message=system_message):
+            finished_files = parser.feed(delta)
+            if finished_files:
+                create_project_files(base_path, finished_files)
+                written_files.extend(finished_files.keys())
+    except Exception as e:
+        print(f"Code generation stream interrupted: {e}. Kept {len(written_files)} finished files.")
+    return written_files
+
+def list_design_files(json_design: str) -> List[str]:
+    """
+    Collect the file paths named in the JSON design, in order of appearance: keys that are paths, and
+    path values under keys about files or containing a directory. If none are found, the model is asked.
+    """
+    file_paths = []
+
+    def walk(value, in_files: bool = False) -> None:
+        if isinstance(value, dict):
+            for key, child in value.items():
+                if FILE_PATH_PATTERN.fullmatch(key.strip()):
+                    file_paths.append(key.strip())
+                walk(child, in_files or any(word in key.lower() for word in ("file", "path", "structure")))
+        elif isinstance(value, list):
+            for child in value:
+                walk(child, in_files)
+        elif isinstance(value, str):
+            path = value.strip()
+            if FILE_PATH_PATTERN.fullmatch(path) and (in_files or "/" in path):
+                file_paths.append(path)
+
+    try:
+        walk(parse_json_response(json_design))
+    except json.JSONDecodeError:
+        pass
+    if not file_paths:
+        file_paths = FILE_PATH_PATTERN.findall(extract_files_from_json(json_design))
+    return list(dict.fromkeys(path[2:] if path.startswith("./") else path for path in file_paths))
+
+def generate_file_from_design(json_design: str, base_path: str, file_path: str, file_paths: List[str]) -> str:
+    system_message = "You are an expert software developer. Based on the following JSON design document, generate the content of one file of the project, consistent with the other files of the design."
+
+    # 设计文档放在前面、目标文件放在最后，各文件的请求共享相同的前缀
+    generation_prompt = f"""Based on the following JSON design document, generate the complete content of one file. The other files of the project are generated separately from the same design, so use only the modules, functions and interfaces the design describes.
+
+JSON Design Document:
+{json_design}
+
+Project Files:
+{chr(10).join(file_paths)}
+
+Base Path:
+{base_path}
+
+Return the file in the following format:
+
+<gen-file path=文件路径>
+文件内容
+</gen-file>
+
+File to generate: {file_path}"""
+
+    response = get_completion(generation_prompt, system_message=system_message)
+    parsed_files = parse_design(response)
+    if file_path in parsed_files:
+        return parsed_files[file_path]
+    if len(parsed_files) == 1:
+        return next(iter(parsed_files.values()))
+    return clean_file_content(response)
+
+def generate_codes_per_file(json_design: str, base_path: str) -> List[str]:
+    """
+    Generate every file listed in the JSON design in its own concurrent request, writing each file as
+    soon as it is done. Falls back to one request for all files when the design lists no files.
+    """
+    file_paths = list_design_files(json_design)
+    if not file_paths:
+        print("No file list found in the design, generating all files in one request...")
+        parsed_files = parse_design(generate_codes_from_basepath(json_design, base_path))
+        create_project_files(base_path, parsed_files)
+        return list(parsed_files.keys())
+    print(f"Generating {len(file_paths)} files concurrently...")
+
+    def generate(file_path: str) -> Optional[str]:
+        try:
+            content = generate_file_from_design(json_design, base_path, file_path, file_paths)
+        except Exception as e:
+            print(f"Could not generate {file_path}: {e}")
+            return None
+        create_project_files(base_path, {file_path: content})
+        return file_path
+
+    return [file_path for file_path in parallel_map(generate, file_paths) if file_path]
+
 def create_project_files(base_path: str, files: Dict[str, str]) -> str:
     for file_path, content in files.items():
         full_path = "{}/{}".format(base_path, file_path).replace("//", "/")
@@ -326,27 +487,16 @@ JSON:"""
     json_content = get_completion(json_prompt, system_message=system_message)
     return json_content.strip()
 
-def senior_developer_agent(requirement: str, language: str, libraries: List[str], base_path: str, comment_language: str, readme_language: str) -> None:
+@report_calls
+def senior_developer_agent(requirement: str, language: str, libraries: List[str], base_path: str, comment_language: str, readme_language: str, generation_mode: str = "batch", design_candidates: int = 1, design_top_k: int = 1) -> None:
     print("Checking project folder and cleaning up obsolete project files...")
     clean_base_path(base_path)
 
-    print("Initial Design...")
-    design = initial_tech_design(requirement, language, libraries, comment_language)
-
-    print("Reviewing and reflecting on the design...")
-    suggestions = reflect_on_tech_design(requirement, language, libraries, design)
-    rated_score = rate_on_tech_design(requirement, language, libraries, design)
-    overall_score = parse_score(rated_score)
-    design_list = [(design, overall_score)]
-
-    print(f"Improving the design ...")
-    design = improve_tech_design(requirement, language, libraries, design, suggestions)
-    rated_score = rate_on_tech_design(requirement, language, libraries, design)
-    overall_score = parse_score(rated_score)
-    design_list.append((design, overall_score))
+    design_list = search_tech_designs(requirement, language, libraries, comment_language, design_candidates, design_top_k)
 
     print("Choosing the best design and verifying its completeness...")
     best_design = max(design_list, key=lambda x: x[1])
+    print(f"Best design score: {best_design[1]} of {len(design_list)} designs")
     best_design_document = verify_and_improve_design(requirement, language, libraries, best_design[0])
 
     json_design = convert_design_to_json(requirement, best_design_document)
@@ -356,11 +506,16 @@ def senior_developer_agent(requirement: str, language: str, libraries: List[str]
         f.write(json_design)
 
     print("Generating Codes...")
-    generated_files = generate_codes_from_basepath(json_design, base_path)
-    parsed_files = parse_design(generated_files)
-
-    print("Creating project files...")
-    create_project_files(base_path, parsed_files)
+    if generation_mode == "stream":
+        stream_codes_from_basepath(json_design, base_path)
+    elif generation_mode == "per_file":
+        generate_codes_per_file(json_design, base_path)
+    else:
+        generated_files = generate_codes_from_basepath(json_design, base_path)
+        parsed_files = parse_design(generated_files)
+
+        print("Creating project files...")
+        create_project_files(base_path, parsed_files)
     file_structure = get_project_structure(base_path, [], [])
     
     print("Generating project settings...")
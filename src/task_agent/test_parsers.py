@@ -0,0 +1,273 @@
+import os
+import re
+import hashlib
+from typing import List, Dict, Optional, Callable
+
+# 诊断信息统一为字典：file, line, code, severity, message
+# severity 取值与 categorize_errors 的分组一致：critical / high / medium / low
+
+RUST_DIAGNOSTIC = re.compile(r"^(error|warning)(?:\[(E\d+)\])?: (.+)$")
+RUST_LOCATION = re.compile(r"^\s*--> (.+?):(\d+):(\d+)")
+RUST_PANIC = re.compile(r"^thread '(.+?)' panicked at (?:'(.*)', )?(.+?):(\d+):(\d+):?$")
+RUST_TEST_RESULT = re.compile(r"^test result: (ok|FAILED)\. (\d+) passed; (\d+) failed")
+RUST_META_ERRORS = ("could not compile", "aborting due to", "test failed, to rerun pass", "build failed")
+
+PYTEST_SUMMARY = re.compile(r"^=+ (.*\b(?:passed|failed|error|errors|skipped|no tests ran)\b.*) in [\d.]+s.*=+$")
+PYTEST_RESULT = re.compile(r"^(FAILED|ERROR) (\S+?)(?:::(\S+))?(?: - (.*))?$")
+PYTEST_LOCATION = re.compile(r"^(\S+\.py):(\d+): (\w+(?:Error|Exception|Exit)?\w*)$")
+
+JEST_FILE = re.compile(r"^\s*(PASS|FAIL)\s+(\S+)")
+JEST_TEST = re.compile(r"^\s*● (.+)$")
+JEST_LOCATION = re.compile(r"\(([^()\s]+?):(\d+):(\d+)\)")
+JEST_SUMMARY = re.compile(r"^Tests:\s+(.*)$")
+
+# 汇总行中报告的失败数量，以及 execute_tests 在命令以非零状态退出时追加的说明
+PYTEST_FAILURE_COUNT = re.compile(r"\b(\d+) (?:failed|errors?)\b")
+JEST_FAILURE_COUNT = re.compile(r"\b(\d+) failed\b")
+TEST_EXIT_STATUS = re.compile(r"^Test command exited with status (-?\d+)\.$", re.MULTILINE)
+
+TSC_DIAGNOSTIC = re.compile(r"^(.+?)(?:\((\d+),(\d+)\)|:(\d+):(\d+)) ?[:-] (error|warning) (TS\d+): (.+)$")
+
+# 计算测试输出指纹前去掉每次运行都会变化的部分：测试工具报告的耗时、时间戳、内存地址和绝对路径
+TIMESTAMP = re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?|(?:^|(?<=^\[))\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b", re.MULTILINE)
+# 只替换已知的计时位置：cargo 构建行的 Finished ... in Xs 与 test result 行的 finished in Xs、
+# pytest 的 in X.XXs、unittest 的 Ran N tests in Xs、jest 的 Time: 以及测试名后的 (N ms)，断言信息中的数值保持不变
+DURATIONS = [
+    re.compile(r"(^\s*Finished .* in )\d+(?:\.\d+)?s$", re.MULTILINE),
+    re.compile(r"(\bfinished in )\d+(?:\.\d+)?s\b"),
+    re.compile(r"(^=+ .* in )\d+(?:\.\d+)?s(?: \(\d+:\d{2}:\d{2}\))?(?= =+$)", re.MULTILINE),
+    re.compile(r"(^Ran \d+ tests? in )\d+(?:\.\d+)?s$", re.MULTILINE),
+    re.compile(r"(^Time:\s+)\d+(?:\.\d+)?\s?(?:ms|s)\b.*$", re.MULTILINE),
+    re.compile(r"(^\s*(?:✓|✕|√|×|○).*?\()\d+(?:\.\d+)?\s?(?:ms|s)(?=\)\s*$)", re.MULTILINE),
+    re.compile(r"(^\s*(?:PASS|FAIL)\s+\S+ \()\d+(?:\.\d+)?\s?(?:ms|s)(?=\)\s*$)", re.MULTILINE),
+]
+MEMORY_ADDRESS = re.compile(r"\b0x[0-9a-fA-F]{6,}\b")
+ABSOLUTE_DIRECTORY = re.compile(r"(?<![\w.])(?:[A-Za-z]:)?[\\/](?:[^\s\\/:'\"()<>\[\],]+[\\/])+")
+
+# 表示依赖或项目配置问题的错误，需要连同项目配置文件一起修改
+DEPENDENCY_ERROR_MARKERS = (
+    "unresolved import",
+    "use of undeclared crate",
+    "can't find crate",
+    "no matching package named",
+    "failed to select a version",
+    "ModuleNotFoundError",
+    "No module named",
+    "Cannot find module",
+    "TS2307",
+)
+
+def make_diagnostic(file: str, line: Optional[int], code: str, severity: str, message: str) -> Dict:
+    return {
+        "file": file,
+        "line": line,
+        "code": code,
+        "severity": severity,
+        "message": message.strip(),
+    }
+
+def parse_cargo_output(output: str) -> Optional[List[Dict]]:
+    lines = output.splitlines()
+    if not any(RUST_DIAGNOSTIC.match(line) or RUST_TEST_RESULT.match(line) or line.strip().startswith(("Compiling ", "Finished ", "Running ")) for line in lines):
+        return None
+
+    diagnostics = []
+    for index, line in enumerate(lines):
+        match = RUST_DIAGNOSTIC.match(line)
+        if match:
+            level, code, message = match.groups()
+            if level == "error" and any(marker in message for marker in RUST_META_ERRORS):
+                continue
+            if level == "warning" and ("generated" in message and "warning" in message):
+                continue
+            file, line_number = "", None
+            for following in lines[index + 1:index + 4]:
+                location = RUST_LOCATION.match(following)
+                if location:
+                    file, line_number = location.group(1), int(location.group(2))
+                    break
+            severity = "critical" if level == "error" else "low"
+            diagnostics.append(make_diagnostic(file, line_number, code or level, severity, message))
+            continue
+
+        match = RUST_PANIC.match(line.strip())
+        if match:
+            test_name, old_message, file, line_number, _ = match.groups()
+            message = old_message or (lines[index + 1].strip() if index + 1 < len(lines) else "")
+            diagnostics.append(make_diagnostic(file, int(line_number), "panic", "high", f"{test_name}: {message}"))
+    return diagnostics
+
+def parse_pytest_output(output: str) -> Optional[List[Dict]]:
+    lines = output.splitlines()
+    if not any(PYTEST_SUMMARY.match(line) or "test session starts" in line or "short test summary info" in line for line in lines):
+        return None
+
+    # 从回溯信息中收集每个文件最后出错的行号
+    locations = {}
+    for line in lines:
+        match = PYTEST_LOCATION.match(line)
+        if match:
+            locations[match.group(1)] = (int(match.group(2)), match.group(3))
+
+    diagnostics = []
+    for line in lines:
+        match = PYTEST_RESULT.match(line)
+        if not match:
+            continue
+        outcome, file, test_name, message = match.groups()
+        line_number, exception = locations.get(file, (None, ""))
+        message = message or exception
+        if outcome == "ERROR":
+            # 收集或 fixture 阶段出错，通常会导致整个文件无法执行
+            code = message.split(":")[0] if message else "error"
+            diagnostics.append(make_diagnostic(file, line_number, code, "critical", message))
+        else:
+            code = message.split(":")[0] if message else "failed"
+            diagnostics.append(make_diagnostic(file, line_number, code, "high", f"{test_name}: {message}" if test_name else message))
+    return diagnostics
+
+def parse_tsc_output(output: str) -> Optional[List[Dict]]:
+    diagnostics = []
+    for line in output.splitlines():
+        match = TSC_DIAGNOSTIC.match(line.strip())
+        if not match:
+            continue
+        file, paren_line, _, colon_line, _, level, code, message = match.groups()
+        line_number = int(paren_line or colon_line)
+        severity = "critical" if level == "error" else "low"
+        diagnostics.append(make_diagnostic(file, line_number, code, severity, message))
+    return diagnostics or None
+
+def parse_jest_output(output: str) -> Optional[List[Dict]]:
+    lines = output.splitlines()
+    if not any(JEST_SUMMARY.match(line) for line in lines) and not any(JEST_FILE.match(line) for line in lines):
+        return None
+
+    diagnostics = parse_tsc_output(output) or []
+    current_file = ""
+    for index, line in enumerate(lines):
+        match = JEST_FILE.match(line)
+        if match:
+            current_file = match.group(2)
+            continue
+        match = JEST_TEST.match(line)
+        if not match or match.group(1).startswith("Console"):
+            continue
+        test_name = match.group(1).strip()
+        file, line_number, message = current_file, None, ""
+        for following in lines[index + 1:index + 40]:
+            if JEST_TEST.match(following) or JEST_FILE.match(following):
+                break
+            if not message and following.strip():
+                message = following.strip()
+            location = JEST_LOCATION.search(following)
+            if location and "node_modules" not in location.group(1):
+                file, line_number = location.group(1), int(location.group(2))
+                break
+        if test_name.startswith("Test suite failed to run"):
+            diagnostics.append(make_diagnostic(file, line_number, "suite", "critical", message))
+        else:
+            diagnostics.append(make_diagnostic(file, line_number, "failed", "high", f"{test_name}: {message}"))
+    return diagnostics
+
+TEST_OUTPUT_PARSERS: List[Callable[[str], Optional[List[Dict]]]] = [
+    parse_cargo_output,
+    parse_pytest_output,
+    parse_jest_output,
+    parse_tsc_output,
+]
+
+def parse_test_output(output: str) -> Optional[List[Dict]]:
+    """
+    Extract structured diagnostics from test or build output.
+    Returns None when the output format is not recognised, so the caller can fall back to the LLM.
+    """
+    if not output or "Test execution timed out." in output:
+        return None
+    for parser in TEST_OUTPUT_PARSERS:
+        diagnostics = parser(output)
+        if diagnostics is not None:
+            return diagnostics
+    return None
+
+def count_errors(diagnostics: List[Dict]) -> int:
+    return sum(1 for diagnostic in diagnostics if diagnostic["severity"] != "low")
+
+def count_reported_failures(output: str) -> int:
+    """
+    Number of failures reported by the summary lines of cargo, pytest and jest output, even when the
+    individual failures could not be parsed.
+    """
+    failures = 0
+    for line in output.splitlines():
+        line = line.strip()
+        match = RUST_TEST_RESULT.match(line)
+        if match:
+            failures += int(match.group(3))
+            continue
+        match = PYTEST_SUMMARY.match(line)
+        if match:
+            failures += sum(int(count) for count in PYTEST_FAILURE_COUNT.findall(match.group(1)))
+            continue
+        match = JEST_SUMMARY.match(line)
+        if match:
+            failures += sum(int(count) for count in JEST_FAILURE_COUNT.findall(match.group(1)))
+    return failures
+
+def exited_with_failure(output: str) -> bool:
+    match = TEST_EXIT_STATUS.search(output)
+    return bool(match) and int(match.group(1)) != 0
+
+def format_diagnostic(diagnostic: Dict) -> str:
+    location = diagnostic["file"]
+    if diagnostic["line"] is not None:
+        location = f"{location}:{diagnostic['line']}"
+    return f"{location}: {diagnostic['code']}: {diagnostic['message']}".strip(": ")
+
+def categorize_diagnostics(diagnostics: List[Dict]) -> Dict[str, List[str]]:
+    categorized = {"critical": [], "high": [], "medium": [], "low": []}
+    for diagnostic in diagnostics:
+        categorized[diagnostic["severity"]].append(format_diagnostic(diagnostic))
+    return categorized
+
+def normalize_diagnostic_path(file: str, base_path: str) -> str:
+    if os.path.isabs(file):
+        file = os.path.relpath(file, os.path.abspath(base_path))
+    return os.path.normpath(file)
+
+def files_from_diagnostics(diagnostics: List[Dict], base_path: str) -> List[str]:
+    files = []
+    for diagnostic in diagnostics:
+        if not diagnostic["file"] or diagnostic["severity"] == "low":
+            continue
+        file = normalize_diagnostic_path(diagnostic["file"], base_path)
+        if file.startswith("..") or not os.path.isfile(os.path.join(base_path, file)):
+            continue
+        if file not in files:
+            files.append(file)
+    return files
+
+def has_dependency_errors(diagnostics: List[Dict]) -> bool:
+    return any(
+        marker in diagnostic["message"] or marker == diagnostic["code"]
+        for diagnostic in diagnostics
+        for marker in DEPENDENCY_ERROR_MARKERS
+    )
+
+def normalize_test_output(output: str, base_path: str = "") -> str:
+    """
+    Test output with the timings of known runners, timestamps, memory addresses and the directories of absolute paths removed,
+    so that two runs failing in the same way compare equal.
+    """
+    if base_path:
+        output = output.replace(os.path.abspath(base_path) + os.sep, "")
+    output = TIMESTAMP.sub("<time>", output)
+    for duration in DURATIONS:
+        output = duration.sub(r"\1<duration>", output)
+    output = MEMORY_ADDRESS.sub("0x?", output)
+    output = ABSOLUTE_DIRECTORY.sub("", output)
+    lines = [line.rstrip() for line in output.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+def fingerprint_test_output(output: str, base_path: str = "") -> str:
+    return hashlib.sha256(normalize_test_output(output, base_path).encode("utf-8")).hexdigest()[:16]
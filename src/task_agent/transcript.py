@@ -0,0 +1,248 @@
+import os
+import json
+import hashlib
+import threading
+from types import SimpleNamespace
+from typing import List, Dict, Optional, Callable, Any, Iterator
+from .config import getenv
+from .test_parsers import normalize_test_output
+
+# TRANSCRIPT_MODE：off 正常请求；record 记录每次请求与响应；replay 从记录中返回响应，不访问网络
+TRANSCRIPT_MODES = ("off", "record", "replay")
+# 回放时按提示词哈希（hash）或按记录顺序（order，优先取哈希相同的下一条）查找响应
+TRANSCRIPT_MATCHES = ("hash", "order")
+
+_transcript_lock = threading.Lock()
+_transcript = None
+_transcript_checked = False
+
+
+class TranscriptError(RuntimeError):
+    pass
+
+
+def prompt_hash(messages: List[Dict[str, Any]]) -> str:
+    """
+    Stable hash of the role and content of the request messages, used to look up recorded responses.
+    Contents are normalized like test output fingerprints, so timings, timestamps and absolute paths
+    embedded in a prompt (e.g. raw test output) do not change the hash between record and replay.
+    """
+    key = json.dumps([[message.get("role"), normalize_test_output(str(message.get("content") or ""))] for message in messages], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class Transcript:
+    """
+    JSONL file of request/response pairs: one {"prompt_hash", "messages", "model", "response",
+    "finish_reason", "usage"} object per completion request. The same file can be served by the mock server.
+    """
+
+    def __init__(self, path: str, mode: str, match: str = "hash"):
+        if mode not in TRANSCRIPT_MODES[1:]:
+            raise ValueError(f"Unknown transcript mode {mode!r}, expected one of {TRANSCRIPT_MODES}")
+        if match not in TRANSCRIPT_MATCHES:
+            raise ValueError(f"Unknown transcript match {match!r}, expected one of {TRANSCRIPT_MATCHES}")
+        self.path = path
+        self.mode = mode
+        self.match = match
+        self._lock = threading.Lock()
+        self.entries = []
+        self._by_hash = {}
+        self._consumed = []
+        self._next_index = 0
+        if mode == "record":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 每次记录都从空文件开始
+            open(path, 'w', encoding='utf-8').close()
+        else:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise TranscriptError(f"Transcript {self.path} does not exist, record one with TRANSCRIPT_MODE=record first.")
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self.entries.append(json.loads(line))
+        for index, entry in enumerate(self.entries):
+            # 重新计算哈希，旧记录也按归一化后的提示词匹配
+            entry["prompt_hash"] = prompt_hash(entry["messages"])
+            self._by_hash.setdefault(entry["prompt_hash"], []).append(index)
+        self._consumed = [False] * len(self.entries)
+        print(f"Replaying {len(self.entries)} responses from {self.path} (match by {self.match}).")
+
+    def record(self, request: Dict[str, Any], response: str, finish_reason: Optional[str], usage: Any = None) -> None:
+        messages = request.get("messages", [])
+        entry = {
+            "prompt_hash": prompt_hash(messages),
+            "messages": messages,
+            "model": request.get("model"),
+            "response": response,
+            "finish_reason": finish_reason,
+            "usage": _usage_dict(usage),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+    def replay(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return the recorded entry for a request. By hash, identical prompts get their recorded responses
+        in turn (the last one repeats). In order, the next unused entry with the same hash is served, so
+        concurrent requests that interleave differently still get their own responses; the next entry by
+        position is only used when it is the same kind of request (same system message and roles).
+        Raises TranscriptError when no recorded entry fits the request.
+        """
+        messages = request.get("messages", [])
+        request_hash = prompt_hash(messages)
+        with self._lock:
+            indexes = self._by_hash.get(request_hash, [])
+            if self.match == "hash":
+                if not indexes:
+                    raise TranscriptError(f"Transcript {self.path} has no response for this prompt (hash {request_hash[:12]}).")
+                # 同一提示词多次请求时依次返回，最后一条重复使用
+                return self.entries[indexes.pop(0) if len(indexes) > 1 else indexes[0]]
+
+            index = next((index for index in indexes if not self._consumed[index]), None)
+            if index is None:
+                while self._next_index < len(self.entries) and self._consumed[self._next_index]:
+                    self._next_index += 1
+                if self._next_index >= len(self.entries):
+                    raise TranscriptError(f"Transcript {self.path} has no more responses for this prompt (hash {request_hash[:12]}).")
+                index = self._next_index
+                if not _same_kind(self.entries[index]["messages"], messages):
+                    raise TranscriptError(f"Transcript entry {index + 1} of {self.path} was recorded for a different request (hash {request_hash[:12]}).")
+                print(f"Transcript entry {index + 1} was recorded for a changed prompt, replaying it in order.")
+            self._consumed[index] = True
+            return self.entries[index]
+
+
+def _same_kind(recorded: List[Dict[str, Any]], messages: List[Dict[str, Any]]) -> bool:
+    # 角色序列和系统消息相同，视为同一类请求（提示词模板相同、内容有变化）
+    if [message.get("role") for message in recorded] != [message.get("role") for message in messages]:
+        return False
+    system = [message.get("content") for message in recorded if message.get("role") == "system"]
+    return system == [message.get("content") for message in messages if message.get("role") == "system"]
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, int]]:
+    if usage is None or getattr(usage, "prompt_tokens", None) is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+
+
+def _usage(entry: Dict[str, Any]) -> Optional[SimpleNamespace]:
+    return SimpleNamespace(**entry["usage"]) if entry.get("usage") else None
+
+
+def get_transcript() -> Optional[Transcript]:
+    """
+    The transcript configured with TRANSCRIPT_MODE, TRANSCRIPT_PATH and TRANSCRIPT_MATCH, or None when off.
+    """
+    global _transcript, _transcript_checked
+    with _transcript_lock:
+        if not _transcript_checked:
+            mode = (getenv("TRANSCRIPT_MODE") or "off").lower()
+            if mode != "off":
+                path = getenv("TRANSCRIPT_PATH") or ".tdd_agents/transcript.jsonl"
+                _transcript = Transcript(path, mode, (getenv("TRANSCRIPT_MATCH") or "hash").lower())
+            _transcript_checked = True
+        return _transcript
+
+
+class _Completions:
+    def __init__(self, create: Callable[..., Any]):
+        self.create = create
+
+
+class ReplayClient:
+    """
+    Stands in for the OpenAI client and answers chat.completions.create from a transcript.
+    """
+
+    def __init__(self, transcript: Transcript):
+        self.transcript = transcript
+        self.chat = SimpleNamespace(completions=_Completions(self.create))
+
+    def create(self, stream: bool = False, **request) -> Any:
+        entry = self.transcript.replay(request)
+        if stream:
+            return self._stream(entry)
+        message = SimpleNamespace(role="assistant", content=entry["response"])
+        choice = SimpleNamespace(index=0, message=message, finish_reason=entry.get("finish_reason") or "stop")
+        return SimpleNamespace(choices=[choice], usage=_usage(entry))
+
+    def _stream(self, entry: Dict[str, Any]) -> Iterator[Any]:
+        delta = SimpleNamespace(content=entry["response"])
+        choice = SimpleNamespace(index=0, delta=delta, finish_reason=entry.get("finish_reason") or "stop")
+        yield SimpleNamespace(choices=[choice], usage=_usage(entry))
+
+
+class AsyncReplayClient(ReplayClient):
+    def __init__(self, transcript: Transcript):
+        super().__init__(transcript)
+        self.chat = SimpleNamespace(completions=_Completions(self.create_async))
+
+    async def create_async(self, stream: bool = False, **request) -> Any:
+        return self.create(stream=stream, **request)
+
+
+class RecordingClient:
+    """
+    Wraps an OpenAI client and records every chat completion into a transcript.
+    """
+
+    def __init__(self, client: Any, transcript: Transcript):
+        self.client = client
+        self.transcript = transcript
+        self.chat = SimpleNamespace(completions=_Completions(self.create))
+
+    def create(self, stream: bool = False, **request) -> Any:
+        if stream:
+            return self._record_stream(self.client.chat.completions.create(stream=True, **request), request)
+        response = self.client.chat.completions.create(**request)
+        choice = response.choices[0]
+        self.transcript.record(request, choice.message.content, choice.finish_reason, getattr(response, "usage", None))
+        return response
+
+    def _record_stream(self, stream: Any, request: Dict[str, Any]) -> Iterator[Any]:
+        content = []
+        finish_reason = None
+        usage = None
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if chunk.choices:
+                content.append(chunk.choices[0].delta.content or "")
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+            yield chunk
+        # 中途断开的流不记录，回放时与实际请求保持一致
+        self.transcript.record(request, "".join(content), finish_reason, usage)
+
+
+class AsyncRecordingClient(RecordingClient):
+    def __init__(self, client: Any, transcript: Transcript):
+        super().__init__(client, transcript)
+        self.chat = SimpleNamespace(completions=_Completions(self.create_async))
+
+    async def create_async(self, **request) -> Any:
+        response = await self.client.chat.completions.create(**request)
+        if not request.get("stream"):
+            choice = response.choices[0]
+            self.transcript.record(request, choice.message.content, choice.finish_reason, getattr(response, "usage", None))
+        return response
+
+
+def transcript_client(build_client: Callable[[], Any], async_client: bool = False) -> Any:
+    """
+    Build the client for the configured transcript mode: the real client, a recording wrapper around it,
+    or a replay client that never builds the real one.
+    """
+    transcript = get_transcript()
+    if transcript is None:
+        return build_client()
+    if transcript.mode == "replay":
+        return AsyncReplayClient(transcript) if async_client else ReplayClient(transcript)
+    return AsyncRecordingClient(build_client(), transcript) if async_client else RecordingClient(build_client(), transcript)
@@ -0,0 +1,179 @@
+import time
+import random
+from typing import Any, Callable, Dict, Optional, Awaitable
+from .config import getenv
+
+# 可重试的 HTTP 状态码：限流与服务端临时错误
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = getenv(name)
+    if value in (None, ""):
+        return default
+    return value.lower() not in ("0", "false", "no")
+
+
+class TransportConfig:
+    """
+    Connection pool, timeout and retry settings for the shared OpenAI clients.
+    Every option defaults to its LLM_* environment variable, so .env and the [llm] section of
+    agent.toml can both be used; explicit arguments take precedence.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        http2: Optional[bool] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+    ):
+        self.max_connections = int(max_connections if max_connections is not None else _env_float("LLM_MAX_CONNECTIONS", 20))
+        self.max_keepalive_connections = int(max_keepalive_connections if max_keepalive_connections is not None else _env_float("LLM_MAX_KEEPALIVE_CONNECTIONS", 10))
+        self.keepalive_expiry = float(keepalive_expiry if keepalive_expiry is not None else _env_float("LLM_KEEPALIVE_EXPIRY", 60))
+        self.connect_timeout = float(connect_timeout if connect_timeout is not None else _env_float("LLM_CONNECT_TIMEOUT", 10))
+        self.read_timeout = float(read_timeout if read_timeout is not None else _env_float("LLM_READ_TIMEOUT", 600))
+        self.http2 = bool(http2 if http2 is not None else _env_bool("LLM_HTTP2", False))
+        self.max_retries = int(max_retries if max_retries is not None else _env_float("LLM_MAX_RETRIES", 5))
+        self.backoff_base = float(backoff_base if backoff_base is not None else _env_float("LLM_BACKOFF_BASE", 1))
+        self.backoff_max = float(backoff_max if backoff_max is not None else _env_float("LLM_BACKOFF_MAX", 60))
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_http_client(config: TransportConfig, async_client: bool = False):
+    import httpx
+    import openai
+
+    http2 = config.http2 and http2_available()
+    if config.http2 and not http2:
+        print("HTTP/2 was requested but the h2 package is not installed, using HTTP/1.1.")
+    options = {
+        "limits": httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+        "http2": http2,
+    }
+    return openai.DefaultAsyncHttpxClient(**options) if async_client else openai.DefaultHttpxClient(**options)
+
+
+def build_openai_client(config: TransportConfig, base_url: Optional[str], api_key: Optional[str], async_client: bool = False):
+    """
+    Build an (Async)OpenAI client on a tuned connection pool. The client's own retries are disabled
+    because call_with_retries handles them with jittered backoff.
+    """
+    import openai
+
+    client_class = openai.AsyncOpenAI if async_client else openai.OpenAI
+    return client_class(
+        base_url=base_url,
+        api_key=api_key,
+        http_client=build_http_client(config, async_client),
+        max_retries=0,
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Read the delay requested by the server from the Retry-After (seconds or HTTP date) or retry-after-ms headers.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    import email.utils
+
+    retry_date = email.utils.parsedate_to_datetime(retry_after) if email.utils.parsedate_tz(retry_after) else None
+    if retry_date is None:
+        return None
+    return max(0.0, retry_date.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, config: TransportConfig, error: Optional[Exception] = None) -> float:
+    """
+    Full-jitter exponential backoff, or the server's Retry-After when it asks for longer.
+    """
+    delay = random.uniform(0, min(config.backoff_max, config.backoff_base * 2 ** attempt))
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def call_with_retries(func: Callable[[], Any], config: TransportConfig, stats: Optional[Dict] = None) -> Any:
+    """
+    Call func, retrying transient failures. The number of retries is added to stats["retries"] if given.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= config.max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, config, e)
+            attempt += 1
+            if stats is not None:
+                stats["retries"] = stats.get("retries", 0) + 1
+            print(f"Request failed ({type(e).__name__}), retry {attempt}/{config.max_retries} in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+async def call_with_retries_async(func: Callable[[], Awaitable[Any]], config: TransportConfig, stats: Optional[Dict] = None) -> Any:
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= config.max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, config, e)
+            attempt += 1
+            if stats is not None:
+                stats["retries"] = stats.get("retries", 0) + 1
+            print(f"Request failed ({type(e).__name__}), retry {attempt}/{config.max_retries} in {delay:.1f}s...")
+            import asyncio
+
+            await asyncio.sleep(delay)
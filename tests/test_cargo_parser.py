@@ -0,0 +1,109 @@
+from task_agent.test_parsers import (
+    count_reported_failures,
+    exited_with_failure,
+    parse_cargo_output,
+    parse_test_output,
+)
+
+
+COMPILE_ERROR = """   Compiling calculator v0.1.0 (/home/user/calculator)
+error[E0425]: cannot find value `total` in this scope
+  --> src/lib.rs:8:5
+   |
+8  |     total
+   |     ^^^^^ not found in this scope
+
+warning: unused variable: `sum`
+ --> src/lib.rs:4:9
+  |
+4 |     let sum = 0;
+  |         ^^^ help: if this is intentional, prefix it with an underscore: `_sum`
+
+warning: `calculator` (lib) generated 1 warning
+error: could not compile `calculator` (lib) due to 1 previous error; 1 warning emitted
+Test command exited with status 101.
+"""
+
+TEST_FAILURE = """    Finished `test` profile [unoptimized + debuginfo] target(s) in 0.41s
+     Running unittests src/lib.rs (target/debug/deps/calculator-3f2a1b4c5d6e7f80)
+
+running 2 tests
+test tests::subtracts ... ok
+test tests::adds ... FAILED
+
+failures:
+
+---- tests::adds stdout ----
+thread 'tests::adds' panicked at src/lib.rs:12:9:
+assertion `left == right` failed
+  left: 1
+ right: 3
+
+failures:
+    tests::adds
+
+test result: FAILED. 1 passed; 1 failed; 0 ignored; 0 measured; 0 filtered out; finished in 0.00s
+
+error: test failed, to rerun pass `--lib`
+Test command exited with status 101.
+"""
+
+OLD_PANIC = """running 1 test
+test tests::divides ... FAILED
+
+---- tests::divides stdout ----
+thread 'tests::divides' panicked at 'attempt to divide by zero', src/lib.rs:20:5
+
+test result: FAILED. 0 passed; 1 failed; 0 ignored; 0 measured; 0 filtered out; finished in 0.00s
+"""
+
+PASSING = """    Finished `test` profile [unoptimized + debuginfo] target(s) in 0.02s
+     Running unittests src/lib.rs (target/debug/deps/calculator-3f2a1b4c5d6e7f80)
+
+running 2 tests
+test tests::adds ... ok
+test tests::subtracts ... ok
+
+test result: ok. 2 passed; 0 failed; 0 ignored; 0 measured; 0 filtered out; finished in 0.00s
+"""
+
+
+def test_compile_error_and_warning():
+    diagnostics = parse_cargo_output(COMPILE_ERROR)
+    assert diagnostics == [
+        {"file": "src/lib.rs", "line": 8, "code": "E0425", "severity": "critical", "message": "cannot find value `total` in this scope"},
+        {"file": "src/lib.rs", "line": 4, "code": "warning", "severity": "low", "message": "unused variable: `sum`"},
+    ]
+    assert exited_with_failure(COMPILE_ERROR)
+
+
+def test_test_panic():
+    diagnostics = parse_cargo_output(TEST_FAILURE)
+    assert diagnostics == [
+        {"file": "src/lib.rs", "line": 12, "code": "panic", "severity": "high", "message": "tests::adds: assertion `left == right` failed"},
+    ]
+    assert count_reported_failures(TEST_FAILURE) == 1
+    assert exited_with_failure(TEST_FAILURE)
+
+
+def test_panic_with_inline_message():
+    diagnostics = parse_cargo_output(OLD_PANIC)
+    assert diagnostics == [
+        {"file": "src/lib.rs", "line": 20, "code": "panic", "severity": "high", "message": "tests::divides: attempt to divide by zero"},
+    ]
+
+
+def test_passing_run():
+    assert parse_cargo_output(PASSING) == []
+    assert count_reported_failures(PASSING) == 0
+    assert not exited_with_failure(PASSING)
+
+
+def test_failures_counted_across_test_binaries():
+    output = PASSING + TEST_FAILURE.replace("1 passed; 1 failed", "0 passed; 2 failed")
+    assert count_reported_failures(output) == 2
+
+
+def test_not_cargo_output():
+    assert parse_cargo_output("make: *** No rule to make target 'test'.  Stop.") is None
+    assert parse_test_output(COMPILE_ERROR) == parse_cargo_output(COMPILE_ERROR)
@@ -0,0 +1,35 @@
+import sys
+
+from task_agent.developer_agent import execute_tests
+
+
+def python_command(code):
+    return f'"{sys.executable}" -c "{code}"'
+
+
+def test_stop_pattern_near_the_deadline_reports_stopped(tmp_path):
+    command = python_command("import time; print('error: could not compile', flush=True); time.sleep(30)")
+    output = execute_tests(command, str(tmp_path), timeout=1.0, stop_patterns=[r"^error"], stop_grace=5.0)
+    assert "Test execution stopped early after a fatal error." in output
+    assert "timed out" not in output
+
+
+def test_timeout_without_stop_pattern(tmp_path):
+    command = python_command("import time; print('running', flush=True); time.sleep(30)")
+    output = execute_tests(command, str(tmp_path), timeout=0.5, stop_patterns=[r"^error"])
+    assert "Test execution timed out." in output
+
+
+def test_non_zero_exit_status_is_noted(tmp_path):
+    output = execute_tests(python_command("import sys; print('boom'); sys.exit(3)"), str(tmp_path))
+    assert output.startswith("boom")
+    assert "Test command exited with status 3." in output
+    assert (tmp_path / "TEST_RESULTS.txt").read_text(encoding="utf-8").startswith("boom")
+
+
+def test_output_is_bounded(tmp_path):
+    output = execute_tests(python_command("[print(i) for i in range(100)]"), str(tmp_path), max_output_lines=10)
+    lines = output.splitlines()
+    assert lines[:5] == ["0", "1", "2", "3", "4"]
+    assert lines[-5:] == ["95", "96", "97", "98", "99"]
+    assert "90 lines omitted" in output
@@ -0,0 +1,81 @@
+from task_agent.test_parsers import fingerprint_test_output, normalize_test_output
+
+
+CARGO_OUTPUT = """   Compiling calculator v0.1.0 (/home/user/calculator)
+    Finished `test` profile [unoptimized + debuginfo] target(s) in {build}s
+     Running unittests src/lib.rs (target/debug/deps/calculator-3f2a1b4c5d6e7f80)
+
+running 1 test
+test tests::adds ... FAILED
+
+failures:
+
+---- tests::adds stdout ----
+thread 'tests::adds' panicked at src/lib.rs:12:9:
+assertion `left == right` failed
+  left: 1
+ right: 3
+
+failures:
+    tests::adds
+
+test result: FAILED. 0 passed; 1 failed; 0 ignored; 0 measured; 0 filtered out; finished in {run}s
+
+error: test failed, to rerun pass `--lib`
+"""
+
+PYTEST_OUTPUT = """============================= test session starts ==============================
+platform linux -- Python 3.11.7, pytest-8.2.0, pluggy-1.5.0
+rootdir: {root}
+collected 2 items
+
+tests/test_counter.py F.                                                 [100%]
+
+=================================== FAILURES ===================================
+E       AssertionError: expected {expected} got 20s
+=========================== short test summary info ============================
+FAILED tests/test_counter.py::test_timeout - AssertionError: expected {expected} got 20s
+========================= 1 failed, 1 passed in {run}s =========================
+"""
+
+
+def test_cargo_timings_do_not_change_the_fingerprint():
+    first = CARGO_OUTPUT.format(build="0.52", run="0.00")
+    second = CARGO_OUTPUT.format(build="12.07", run="0.31")
+    assert fingerprint_test_output(first) == fingerprint_test_output(second)
+
+
+def test_cargo_build_line_is_normalized():
+    normalized = normalize_test_output(CARGO_OUTPUT.format(build="0.52", run="0.00"))
+    assert "target(s) in <duration>" in normalized
+    assert "finished in <duration>" in normalized
+
+
+def test_pytest_timings_and_root_do_not_change_the_fingerprint():
+    first = PYTEST_OUTPUT.format(root="/tmp/run_a/project", expected="10s", run="0.12")
+    second = PYTEST_OUTPUT.format(root="/tmp/run_b/project", expected="10s", run="3.50")
+    assert fingerprint_test_output(first) == fingerprint_test_output(second)
+
+
+def test_jest_timings_do_not_change_the_fingerprint():
+    first = " PASS  src/slow.test.ts (5.123 s)\n  \u2713 parses input (12 ms)\n\nTests:       1 passed, 1 total\nTime:        5.9 s\n"
+    second = " PASS  src/slow.test.ts (6.01 s)\n  \u2713 parses input (9 ms)\n\nTests:       1 passed, 1 total\nTime:        6.4 s\n"
+    assert normalize_test_output(first) == normalize_test_output(second)
+    assert "src/slow.test.ts (<duration>)" in normalize_test_output(first)
+
+
+def test_assertion_values_change_the_fingerprint():
+    first = PYTEST_OUTPUT.format(root="/tmp/project", expected="10s", run="0.12")
+    second = PYTEST_OUTPUT.format(root="/tmp/project", expected="30s", run="0.12")
+    assert fingerprint_test_output(first) != fingerprint_test_output(second)
+
+
+def test_timestamps_and_memory_addresses_are_removed():
+    first = "2024-05-01 12:00:01,123 ERROR <object at 0x7f3a2b1c9d00>"
+    second = "2024-06-11 08:15:44,901 ERROR <object at 0x7f00deadbeef>"
+    assert normalize_test_output(first) == normalize_test_output(second)
+
+
+def test_base_path_prefix_is_removed():
+    normalized = normalize_test_output("/work/project/src/lib.rs:12:9: boom", "/work/project")
+    assert normalized == "src/lib.rs:12:9: boom"
@@ -0,0 +1,55 @@
+from task_agent.agent import GenFileStreamParser, parse_design
+
+
+RESPONSE = """Here are the files.
+
+<gen-file path="Cargo.toml">
+[package]
+name = "calculator"
+version = "0.1.0"
+</gen-file>
+
+<gen-file path='src/lib.rs'>
+```rust
+pub fn add(a: i32, b: i32) -> i32 {
+    a + b
+}
+```
+</gen-file>
+Done.
+"""
+
+
+def feed_in_chunks(text, size):
+    parser = GenFileStreamParser()
+    return [parser.feed(text[start:start + size]) for start in range(0, len(text), size)]
+
+
+def test_whole_response_matches_parse_design():
+    parser = GenFileStreamParser()
+    assert parser.feed(RESPONSE) == parse_design(RESPONSE)
+    assert parse_design(RESPONSE)["src/lib.rs"] == "pub fn add(a: i32, b: i32) -> i32 {\n    a + b\n}"
+
+
+def test_each_block_is_returned_when_its_closing_tag_arrives():
+    first_close = RESPONSE.index("</gen-file>") + len("</gen-file>")
+    parser = GenFileStreamParser()
+    assert parser.feed(RESPONSE[:first_close - 1]) == {}
+    assert list(parser.feed(RESPONSE[first_close - 1:first_close])) == ["Cargo.toml"]
+    assert list(parser.feed(RESPONSE[first_close:])) == ["src/lib.rs"]
+
+
+def test_closing_tag_split_across_chunks():
+    for size in (1, 3, 7, 11, 64):
+        fed = feed_in_chunks(RESPONSE, size)
+        files = {}
+        for chunk_files in fed:
+            assert not set(chunk_files) & set(files)
+            files.update(chunk_files)
+        assert files == parse_design(RESPONSE)
+
+
+def test_unclosed_block_is_not_returned():
+    parser = GenFileStreamParser()
+    assert parser.feed('<gen-file path="src/main.rs">\nfn main() {\n') == {}
+    assert parser.feed("}\n") == {}
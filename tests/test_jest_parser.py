@@ -0,0 +1,88 @@
+from task_agent.test_parsers import (
+    count_reported_failures,
+    exited_with_failure,
+    parse_jest_output,
+    parse_test_output,
+)
+
+
+TEST_FAILURE = """ PASS  src/format.test.ts
+ FAIL  src/calculator.test.ts
+  ● calculator › adds two numbers
+
+    expect(received).toBe(expected) // Object.is equality
+
+    Expected: 3
+    Received: -1
+
+      5 | test('adds two numbers', () => {
+    > 6 |   expect(add(1, 2)).toBe(3);
+        |                     ^
+      7 | });
+
+      at Object.<anonymous> (src/calculator.test.ts:6:21)
+
+Test Suites: 1 failed, 1 passed, 2 total
+Tests:       1 failed, 4 passed, 5 total
+Snapshots:   0 total
+Time:        1.532 s
+Test command exited with status 1.
+"""
+
+SUITE_FAILURE = """ FAIL  src/parser.test.ts
+  ● Test suite failed to run
+
+    src/parser.ts:3:10 - error TS2305: Module '"./tokens"' has no exported member 'Token'.
+
+    3 import { Token } from './tokens';
+               ~~~~~
+
+Test Suites: 1 failed, 1 failed
+Tests:       0 total
+Time:        0.9 s
+"""
+
+PASSING = """ PASS  src/calculator.test.ts
+  calculator
+    ✓ adds two numbers (2 ms)
+
+Test Suites: 1 passed, 1 total
+Tests:       1 passed, 1 total
+Snapshots:   0 total
+Time:        0.612 s
+"""
+
+
+def test_failed_assertion():
+    diagnostics = parse_jest_output(TEST_FAILURE)
+    assert diagnostics == [
+        {
+            "file": "src/calculator.test.ts",
+            "line": 6,
+            "code": "failed",
+            "severity": "high",
+            "message": "calculator › adds two numbers: expect(received).toBe(expected) // Object.is equality",
+        },
+    ]
+    assert count_reported_failures(TEST_FAILURE) == 1
+    assert exited_with_failure(TEST_FAILURE)
+
+
+def test_suite_failed_to_run():
+    diagnostics = parse_jest_output(SUITE_FAILURE)
+    assert {"file": "src/parser.ts", "line": 3, "code": "TS2305", "severity": "critical", "message": "Module '\"./tokens\"' has no exported member 'Token'."} in diagnostics
+    suite = [diagnostic for diagnostic in diagnostics if diagnostic["code"] == "suite"]
+    assert len(suite) == 1
+    assert suite[0]["file"] == "src/parser.test.ts"
+    assert suite[0]["severity"] == "critical"
+
+
+def test_passing_run():
+    assert parse_jest_output(PASSING) == []
+    assert count_reported_failures(PASSING) == 0
+    assert not exited_with_failure(PASSING)
+
+
+def test_not_jest_output():
+    assert parse_jest_output("Ran 3 tests in 0.001s\n\nOK") is None
+    assert parse_test_output(TEST_FAILURE) == parse_jest_output(TEST_FAILURE)
@@ -0,0 +1,158 @@
+import pytest
+
+from task_agent.patching import (
+    PatchError,
+    apply_edit,
+    apply_search_replace,
+    apply_unified_diff,
+    parse_edits,
+    parse_search_replace_blocks,
+)
+
+
+ORIGINAL = """fn add(a: i32, b: i32) -> i32 {
+    a - b
+}
+
+fn sub(a: i32, b: i32) -> i32 {
+    a - b
+}
+"""
+
+
+def test_search_replace():
+    edit = """<<<<<<< SEARCH
+fn add(a: i32, b: i32) -> i32 {
+    a - b
+=======
+fn add(a: i32, b: i32) -> i32 {
+    a + b
+>>>>>>> REPLACE
+"""
+    patched = apply_search_replace(ORIGINAL, parse_search_replace_blocks(edit))
+    assert patched == ORIGINAL.replace("    a - b", "    a + b", 1)
+
+
+def test_search_replace_ignores_indentation_and_appends_on_empty_search():
+    edit = """<<<<<<< SEARCH
+fn sub(a: i32, b: i32) -> i32 {
+  a - b
+}
+=======
+fn sub(a: i32, b: i32) -> i32 {
+    a.wrapping_sub(b)
+}
+>>>>>>> REPLACE
+<<<<<<< SEARCH
+=======
+
+fn mul(a: i32, b: i32) -> i32 {
+    a * b
+}
+>>>>>>> REPLACE
+"""
+    patched = apply_edit(ORIGINAL, edit)
+    assert "    a.wrapping_sub(b)\n}\n\nfn mul(a: i32, b: i32) -> i32 {\n    a * b\n}\n" in patched
+    assert patched.startswith("fn add(a: i32, b: i32) -> i32 {\n    a - b\n}")
+
+
+def test_search_replace_fuzzy_match():
+    edit = """<<<<<<< SEARCH
+fn add(a: i32, b: i32) -> i32 {   // adds
+    a - b
+=======
+fn add(a: i32, b: i32) -> i32 {
+    a + b
+>>>>>>> REPLACE
+"""
+    assert apply_edit(ORIGINAL, edit).startswith("fn add(a: i32, b: i32) -> i32 {\n    a + b\n}")
+
+
+def test_search_block_not_found():
+    edit = """<<<<<<< SEARCH
+impl Display for Calculator {
+=======
+>>>>>>> REPLACE
+"""
+    with pytest.raises(PatchError):
+        apply_edit(ORIGINAL, edit)
+
+
+def test_unterminated_block():
+    with pytest.raises(PatchError):
+        parse_search_replace_blocks("<<<<<<< SEARCH\na - b\n=======\na + b\n")
+
+
+def test_unified_diff_uses_line_numbers_to_pick_the_hunk():
+    edit = """--- a/src/lib.rs
++++ b/src/lib.rs
+@@ -5,3 +5,3 @@
+ fn sub(a: i32, b: i32) -> i32 {
+-    a - b
++    a.wrapping_sub(b)
+ }
+"""
+    patched = apply_unified_diff(ORIGINAL, edit)
+    assert patched == ORIGINAL[:ORIGINAL.rindex("    a - b")] + "    a.wrapping_sub(b)\n}\n"
+
+
+def test_unified_diff_with_several_hunks_and_stale_line_numbers():
+    edit = """@@ -1,3 +1,4 @@
++/// Adds two numbers.
+ fn add(a: i32, b: i32) -> i32 {
+-    a - b
++    a + b
+ }
+@@ -20,2 +21,3 @@
+ fn sub(a: i32, b: i32) -> i32 {
++    // subtraction
+     a - b
+"""
+    patched = apply_edit(ORIGINAL, edit)
+    assert patched == """/// Adds two numbers.
+fn add(a: i32, b: i32) -> i32 {
+    a + b
+}
+
+fn sub(a: i32, b: i32) -> i32 {
+    // subtraction
+    a - b
+}
+"""
+
+
+def test_unified_diff_does_not_apply():
+    with pytest.raises(PatchError):
+        apply_unified_diff(ORIGINAL, "@@ -1,2 +1,2 @@\n-fn div() {}\n+fn div() -> i32 { 0 }\n")
+    with pytest.raises(PatchError):
+        apply_unified_diff(ORIGINAL, "fn add() {}")
+
+
+def test_edit_in_unknown_format():
+    with pytest.raises(PatchError):
+        apply_edit(ORIGINAL, "fn add(a: i32, b: i32) -> i32 { a + b }")
+
+
+def test_parse_edits():
+    response = """I fixed the sign and removed the unused module.
+
+<edit path="src/lib.rs">
+<<<<<<< SEARCH
+    a - b
+=======
+    a + b
+>>>>>>> REPLACE
+</edit>
+<edit path='src/lib.rs'>
+@@ -5,1 +5,1 @@
+-fn sub(a: i32, b: i32) -> i32 {
++pub fn sub(a: i32, b: i32) -> i32 {
+</edit>
+<delete path="src/old.rs"/>
+<delete path=src/unused.rs>
+"""
+    edits, files_to_delete = parse_edits(response)
+    assert list(edits) == ["src/lib.rs"]
+    assert edits["src/lib.rs"].startswith("<<<<<<< SEARCH\n")
+    assert "@@ -5,1 +5,1 @@" in edits["src/lib.rs"]
+    assert files_to_delete == ["src/old.rs", "src/unused.rs"]
@@ -0,0 +1,89 @@
+from task_agent.path_filter import PathMatcher, build_project_structure, compile_file_extensions
+
+
+def test_bare_names_match_exact_folder_at_any_depth():
+    matcher = PathMatcher(["target", "node_modules"])
+    assert matcher.matches("target")
+    assert matcher.matches("crates/core/target")
+    assert matcher.matches("web/node_modules")
+    assert not matcher.matches("targets")
+    assert not matcher.matches("src/target_dir")
+
+
+def test_anchored_paths_only_match_from_the_root():
+    matcher = PathMatcher(["/dist", "build/output"])
+    assert matcher.matches("dist")
+    assert matcher.matches("build/output")
+    assert not matcher.matches("web/dist")
+    assert not matcher.matches("build")
+    assert not matcher.matches("src/build/output")
+
+
+def test_directory_only_rules():
+    matcher = PathMatcher(["logs/", "/coverage/", "./tmp/"])
+    assert matcher.matches("logs")
+    assert matcher.matches("api/logs")
+    assert matcher.matches("coverage")
+    assert not matcher.matches("src/coverage")
+    assert matcher.matches("tmp")
+
+
+def test_globs():
+    matcher = PathMatcher(["*.egg-info", "cache-?", "build-[0-9]", "docs/*/generated", "**/snapshots", "vendor/**"])
+    assert matcher.matches("my_package.egg-info")
+    assert matcher.matches("src/my_package.egg-info")
+    assert matcher.matches("cache-1")
+    assert not matcher.matches("cache-10")
+    assert matcher.matches("build-3")
+    assert not matcher.matches("build-x")
+    assert matcher.matches("docs/api/generated")
+    assert not matcher.matches("docs/api/v1/generated")
+    assert matcher.matches("tests/snapshots")
+    assert matcher.matches("vendor/github.com/lib")
+
+
+def test_double_star_spans_directories():
+    matcher = PathMatcher(["docs/**/generated"])
+    assert matcher.matches("docs/generated")
+    assert matcher.matches("docs/api/v1/generated")
+    assert not matcher.matches("src/generated")
+
+
+def test_negation_overrides_earlier_rules():
+    matcher = PathMatcher(["build", "out-*", "!build", "!out-keep"])
+    assert not matcher.matches("build")
+    assert not matcher.matches("src/build")
+    assert matcher.matches("out-debug")
+    assert not matcher.matches("out-keep")
+
+
+def test_comments_and_blank_lines_are_ignored():
+    matcher = PathMatcher(["# target", "", "   ", "/"])
+    assert not matcher.matches("target")
+    assert not matcher.matches("# target")
+
+
+def test_file_extensions():
+    matches = compile_file_extensions(["rs", ".toml", "Makefile", ".d.ts"])
+    assert matches("main.rs")
+    assert matches("Cargo.toml")
+    assert matches("Makefile")
+    assert matches("index.d.ts")
+    assert not matches("main.rsx")
+    assert not matches("README.md")
+
+
+def test_build_project_structure_prunes_skipped_folders(tmp_path):
+    for path in ["src/main.rs", "src/README.md", "target/debug/main.rs", "targets/main.rs", "logs/run.rs"]:
+        file = tmp_path / path
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text("", encoding="utf-8")
+    (tmp_path / ".gitignore").write_text("# build output\nlogs/\n", encoding="utf-8")
+
+    structure = build_project_structure(str(tmp_path), ["target"], ["rs"])
+
+    assert structure["src"] == ["main.rs"]
+    assert structure["targets"] == ["main.rs"]
+    assert "target" not in structure
+    assert "target/debug" not in structure
+    assert "logs" not in structure
@@ -0,0 +1,96 @@
+from task_agent.test_parsers import (
+    count_reported_failures,
+    exited_with_failure,
+    parse_pytest_output,
+    parse_test_output,
+)
+
+
+ASSERTION_FAILURE = """============================= test session starts ==============================
+platform linux -- Python 3.11.6, pytest-8.3.3, pluggy-1.5.0
+rootdir: /home/user/calculator
+collected 3 items
+
+tests/test_calculator.py .F.                                             [100%]
+
+=================================== FAILURES ===================================
+__________________________________ test_add ____________________________________
+
+    def test_add():
+>       assert add(1, 2) == 3
+E       assert -1 == 3
+E        +  where -1 = add(1, 2)
+
+tests/test_calculator.py:7: AssertionError
+=========================== short test summary info ============================
+FAILED tests/test_calculator.py::test_add - assert -1 == 3
+========================= 1 failed, 2 passed in 0.03s ==========================
+Test command exited with status 1.
+"""
+
+COLLECTION_ERROR = """============================= test session starts ==============================
+collected 0 items / 1 error
+
+==================================== ERRORS ====================================
+___________________ ERROR collecting tests/test_parser.py ______________________
+ImportError while importing test module '/home/user/calculator/tests/test_parser.py'.
+E   ModuleNotFoundError: No module named 'calculator.parser'
+=========================== short test summary info ============================
+ERROR tests/test_parser.py
+!!!!!!!!!!!!!!!!!!!! Interrupted: 1 error during collection !!!!!!!!!!!!!!!!!!!!
+=============================== 1 error in 0.08s ===============================
+Test command exited with status 2.
+"""
+
+UNPARSED_FAILURES = """============================= test session starts ==============================
+collected 5 items
+
+tests/test_calculator.py ..FF.                                           [100%]
+
+==================== 2 failed, 3 passed, 1 error in 0.12s =====================
+Test command exited with status 1.
+"""
+
+PASSING = """============================= test session starts ==============================
+collected 3 items
+
+tests/test_calculator.py ...                                             [100%]
+
+============================== 3 passed in 0.01s ===============================
+"""
+
+
+def test_assertion_failure():
+    diagnostics = parse_pytest_output(ASSERTION_FAILURE)
+    assert diagnostics == [
+        {"file": "tests/test_calculator.py", "line": 7, "code": "assert -1 == 3", "severity": "high", "message": "test_add: assert -1 == 3"},
+    ]
+    assert count_reported_failures(ASSERTION_FAILURE) == 1
+    assert exited_with_failure(ASSERTION_FAILURE)
+
+
+def test_collection_error():
+    diagnostics = parse_pytest_output(COLLECTION_ERROR)
+    assert len(diagnostics) == 1
+    assert diagnostics[0]["file"] == "tests/test_parser.py"
+    assert diagnostics[0]["severity"] == "critical"
+    assert count_reported_failures(COLLECTION_ERROR) == 1
+
+
+def test_summary_counts_failures_and_errors():
+    assert parse_pytest_output(UNPARSED_FAILURES) == []
+    assert count_reported_failures(UNPARSED_FAILURES) == 3
+    assert exited_with_failure(UNPARSED_FAILURES)
+
+
+def test_passing_run():
+    assert parse_pytest_output(PASSING) == []
+    assert count_reported_failures(PASSING) == 0
+    assert not exited_with_failure(PASSING)
+    assert not exited_with_failure(PASSING + "Test command exited with status 0.\n")
+
+
+def test_not_pytest_output():
+    assert parse_pytest_output("Ran 3 tests in 0.001s\n\nOK") is None
+    assert parse_test_output(ASSERTION_FAILURE) == parse_pytest_output(ASSERTION_FAILURE)
+    assert parse_test_output(ASSERTION_FAILURE + "Test execution timed out.") is None
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from task_agent.agent import repair_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"name": "calculator", "files": ["src/lib.rs"]}', {"name": "calculator", "files": ["src/lib.rs"]}),
+    ('Here is the design:\n```json\n{"name": "calculator"}\n```\nLet me know if you need more.', {"name": "calculator"}),
+    ('```json\n{"name": "calculator"}', {"name": "calculator"}),
+    ("{'name': 'calculator', 'note': 'say \"hi\"'}", {"name": "calculator", "note": 'say "hi"'}),
+    ("{'name': 'it\\'s'}", {"name": "it's"}),
+    ('{"content": "fn main() {\n    println!(\\"hi\\");\n}"}', {"content": 'fn main() {\n    println!("hi");\n}'}),
+    ('{"files": ["a.rs", "b.rs",], "done": true,}', {"files": ["a.rs", "b.rs"], "done": True}),
+    ('[{"path": "a.rs"}, {"path": "b.rs"}] trailing prose', [{"path": "a.rs"}, {"path": "b.rs"}]),
+])
+def test_repairs_common_defects(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"files": {"src/lib.rs": "fn add() {', {"files": {"src/lib.rs": "fn add() {"}}),
+    ('{"files": {"src/lib.rs": "a\\', {"files": {"src/lib.rs": "a"}}),
+    ('{"name": "calculator", "files": [', {"name": "calculator", "files": []}),
+    ('{"name": "calculator", "version":', {"name": "calculator", "version": None}),
+    ('{"steps": ["design", "build",', {"steps": ["design", "build"]}),
+])
+def test_closes_a_truncated_tail(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_text_without_json_is_returned_unchanged():
+    assert repair_json("  no json here  ") == "no json here"
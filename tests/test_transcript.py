@@ -0,0 +1,110 @@
+import json
+import random
+import time
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+import task_agent.agent as agent
+import task_agent.transcript as transcript
+from task_agent.mock_server import MockLLMServer, ResponseScript
+from task_agent.senior_developer_agent import search_tech_designs
+from task_agent.transcript import Transcript, TranscriptError
+
+
+RESPONSES = [
+    {"match": r"Design Direction:\n", "echo": r"Design Direction:\n(.*?)\n"},
+    {"match": r"design a highly modular technical solution", "content": "Keep a single module."},
+    {"match": r"reflecting on the following technical design", "echo": r"Initial Design:\n(.*?)\n"},
+    {"match": r"rating the following technical design", "content": "Overall Score: 80/100"},
+    {"match": r"improve the initial technical design", "echo": r"Suggestions:\n(.*?)\n"},
+    {"match": r"Summarize the test output", "content": "One test fails."},
+]
+
+
+class HttpClient:
+    """
+    Minimal chat completions client over urllib, with a random delay so concurrent requests interleave differently.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        time.sleep(random.uniform(0, 0.02))
+        http_request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(request).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(http_request) as response:
+            data = json.loads(response.read())
+        choice = data["choices"][0]
+        message = SimpleNamespace(content=choice["message"]["content"])
+        usage = SimpleNamespace(**{key: data["usage"][key] for key in ("prompt_tokens", "completion_tokens")})
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=choice["finish_reason"])], usage=usage)
+
+
+def start_transcript(monkeypatch, mode, path, match="hash"):
+    monkeypatch.setenv("TRANSCRIPT_MODE", mode)
+    monkeypatch.setenv("TRANSCRIPT_PATH", str(path))
+    monkeypatch.setenv("TRANSCRIPT_MATCH", match)
+    monkeypatch.setattr(transcript, "_transcript", None)
+    monkeypatch.setattr(transcript, "_transcript_checked", False)
+    monkeypatch.setattr(agent, "client", None)
+
+
+def run_session(test_time):
+    designs = search_tech_designs("Count words in a text.", "python 3.11", ["pytest"], "English", candidates=3, top_k=2)
+    test_output = (
+        f"    Finished `test` profile [unoptimized + debuginfo] target(s) in {test_time}s\n"
+        "/tmp/run/project/tests/test_a.py:3: AssertionError\n"
+        f"==================== 1 failed, 2 passed in {test_time}s ===================="
+    )
+    summary = agent.get_completion(f"Summarize the test output:\n{test_output}")
+    return designs, summary
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    monkeypatch.setenv("CALL_LOG", "none")
+    monkeypatch.setenv("MODEL", "mock")
+    monkeypatch.setattr(agent, "MODEL", None)
+    server = MockLLMServer(ResponseScript(RESPONSES)).start()
+    monkeypatch.setattr(agent, "build_openai_client", lambda config, base_url, api_key, async_client=False: HttpClient(server.base_url))
+    yield tmp_path / "transcript.jsonl"
+    server.stop()
+
+
+@pytest.mark.parametrize("match", ["hash", "order"])
+def test_record_then_replay_design_search(monkeypatch, session, match):
+    start_transcript(monkeypatch, "record", session)
+    recorded = run_session("0.12")
+    assert recorded[1] == "One test fails."
+
+    start_transcript(monkeypatch, "replay", session, match)
+    monkeypatch.setattr(agent, "build_openai_client", None)
+    assert run_session("3.47") == recorded
+
+
+def test_order_mode_raises_on_a_different_request(tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    recorder = Transcript(str(path), "record")
+    recorder.record({"messages": [{"role": "system", "content": "A"}, {"role": "user", "content": "one"}]}, "first", "stop")
+
+    replay = Transcript(str(path), "replay", "order")
+    with pytest.raises(TranscriptError):
+        replay.replay({"messages": [{"role": "system", "content": "B"}, {"role": "user", "content": "two"}]})
+
+
+def test_order_mode_serves_matching_hash_before_position(tmp_path):
+    path = tmp_path / "transcript.jsonl"
+    recorder = Transcript(str(path), "record")
+    for prompt in ("one", "two"):
+        recorder.record({"messages": [{"role": "system", "content": "A"}, {"role": "user", "content": prompt}]}, f"answer {prompt}", "stop")
+
+    replay = Transcript(str(path), "replay", "order")
+    assert replay.replay({"messages": [{"role": "system", "content": "A"}, {"role": "user", "content": "two"}]})["response"] == "answer two"
+    assert replay.replay({"messages": [{"role": "system", "content": "A"}, {"role": "user", "content": "one"}]})["response"] == "answer one"
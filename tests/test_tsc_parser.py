@@ -0,0 +1,43 @@
+from task_agent.test_parsers import has_dependency_errors, parse_test_output, parse_tsc_output
+
+
+PRETTY_OUTPUT = """src/calculator.ts:12:5 - error TS2322: Type 'string' is not assignable to type 'number'.
+
+12     return `${a + b}`;
+       ~~~~~~
+
+src/index.ts:1:21 - error TS2307: Cannot find module './parser' or its corresponding type declarations.
+
+1 import { parse } from './parser';
+                      ~~~~~~~~~~
+
+
+Found 2 errors in 2 files.
+"""
+
+PLAIN_OUTPUT = """src/calculator.ts(12,5): error TS2322: Type 'string' is not assignable to type 'number'.
+src/format.ts(3,1): warning TS6133: 'unused' is declared but its value is never read.
+"""
+
+
+def test_pretty_output():
+    diagnostics = parse_tsc_output(PRETTY_OUTPUT)
+    assert diagnostics == [
+        {"file": "src/calculator.ts", "line": 12, "code": "TS2322", "severity": "critical", "message": "Type 'string' is not assignable to type 'number'."},
+        {"file": "src/index.ts", "line": 1, "code": "TS2307", "severity": "critical", "message": "Cannot find module './parser' or its corresponding type declarations."},
+    ]
+    assert has_dependency_errors(diagnostics)
+
+
+def test_plain_output():
+    diagnostics = parse_tsc_output(PLAIN_OUTPUT)
+    assert [(d["file"], d["line"], d["code"], d["severity"]) for d in diagnostics] == [
+        ("src/calculator.ts", 12, "TS2322", "critical"),
+        ("src/format.ts", 3, "TS6133", "low"),
+    ]
+    assert not has_dependency_errors(diagnostics)
+
+
+def test_clean_compile():
+    assert parse_tsc_output("") is None
+    assert parse_test_output(PRETTY_OUTPUT) == parse_tsc_output(PRETTY_OUTPUT)